@@ -1,85 +1,284 @@
 import os
+import json
 import unicodedata
 import requests
 import re
+import tempfile
+import threading
+import time
+import collections
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from config import JIRA_DOMAIN, JIRA_EMAIL, JIRA_API_TOKEN, Space_Keys, File_Dir
 from features.chatbot import Knowledge
 
+MAX_CONCURRENT_FETCHES = 10  # upper bound on spaces crawled in parallel
+PAGE_WRITE_WORKERS = 8  # threads extracting/writing pages per space
+PAGE_FETCH_WORKERS = 8  # concurrent result-page requests per space
+PAGE_LIMIT = 50  # pages per search response
+REQUEST_TIMEOUT = 30  # seconds per Confluence request
+MAX_RETRIES = 5  # retries of a throttled or failed request
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled on each one after
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+PROGRESS_EVERY = 50  # pages written between progress lines
+WRITE_BUFFER_SIZE = 1 << 20  # 1 MB buffer so large pages are written in few syscalls
+# only expand what the writer reads: body.storage.value and version.number (title/_links are always returned)
+PAGE_EXPAND = "body.storage,version"
+manifest_name = ".confluence_manifest.json"  # page id -> last written version, kept outside File_Dir
+
+_INVALID_TRANS = str.maketrans({c: "_" for c in '\\/*?:"<>|'})  # Windows-reserved
+_WS_RE = re.compile(r"\s+")
+_EMOJI_RE = re.compile(r"[\U00010000-\U0010FFFF]")  # emoji/supplementary
+
+
+class CrawlDeadlineExceeded(TimeoutError):
+    """Raised instead of issuing a request, or waiting to retry one, past the crawl's deadline."""
 
 class WebScraper:
     def __init__(self):
         self.BASE_URL = f"https://{JIRA_DOMAIN}/wiki/rest/api"
         self.auth = HTTPBasicAuth(JIRA_EMAIL, JIRA_API_TOKEN)
+        # One pooled session so every pagination step reuses the same TLS connection
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        # retries are done in _get_json rather than by urllib3, so they can stop at the crawl's deadline
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+        # one crawl at a time per scraper: a second one would reset and rewrite the manifest under the first
+        self._crawl_lock = threading.Lock()
+        self._deadline = None  # time.monotonic() at which the running crawl stops, or None
+        self._stopped_early = False  # set when a space stops at the deadline
+        self._claimed_paths = {}  # target file -> page id, so two pages never share one file in a crawl
+        self._claimed_paths_lock = threading.Lock()
+        self.manifest = {}
 
-    def get_confluence_pages(self, space_key):
-        """Fetch all pages from a given Confluence space."""
+    def load_manifest(self):
+        """Load the page version manifest from the previous crawl."""
+        try:
+            with open(manifest_name, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def save_manifest(self):
+        """Persist the page version manifest for the next crawl."""
+        with open(manifest_name, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+
+    def is_page_unchanged(self, page, file_path):
+        """Check whether a page was already written at its current version."""
+        entry = self.manifest.get(page.get("id"))
+        version = page.get("version", {}).get("number")
+        return (
+            entry is not None
+            and version is not None
+            and entry.get("version") == version
+            and entry.get("file") == file_path
+            and os.path.exists(file_path)
+        )
+
+    def _deadline_passed(self):
+        """Check whether the running crawl has used up its time budget."""
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _time_left(self):
+        """Seconds until the running crawl's deadline, or None without one."""
+        return None if self._deadline is None else self._deadline - time.monotonic()
+
+    def _get_json(self, url, params=None):
+        """GET one search response and decode it, backing off on throttling within the crawl's deadline."""
+        for attempt in range(MAX_RETRIES + 1):
+            time_left = self._time_left()
+            if time_left is not None and time_left <= 0:
+                raise CrawlDeadlineExceeded(f"Confluence crawl deadline reached before GET {url}")
+            timeout = REQUEST_TIMEOUT if time_left is None else min(REQUEST_TIMEOUT, time_left)
+            try:
+                resp = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self._deadline_passed():
+                    raise CrawlDeadlineExceeded(f"Confluence crawl deadline reached during GET {url}") from e
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    return resp.json()
+                retry_after = resp.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * 2 ** attempt
+            time_left = self._time_left()
+            if time_left is not None and delay >= time_left:
+                raise CrawlDeadlineExceeded(f"Confluence crawl deadline reached while retrying GET {url}")
+            time.sleep(delay)
+
+    def iter_confluence_pages(self, space_key):
+        """Yield pages from a given Confluence space one response at a time."""
         url = f"https://{JIRA_DOMAIN}/wiki/rest/api/content/search"
         cql = f"space={space_key} AND type=page"
-        all_pages = []
 
         # initial request
-        params = {"cql": cql, "limit": 50, "expand": "body.storage"}
-        resp = requests.get(url, params=params, auth=self.auth)
-        data = resp.json()
+        params = {"cql": cql, "limit": PAGE_LIMIT, "expand": PAGE_EXPAND}
+        data = self._get_json(url, params)
+        yield from data.get("results", [])
 
-        while True:
-            results = data.get("results", [])
-            all_pages.extend(results)
+        next_link = data.get("_links", {}).get("next")
+        if not next_link:
+            return  # single page of results
+        total = data.get("totalSize")
+        limit = data.get("limit") or PAGE_LIMIT
+        if total is not None and "start" in data:
+            # offsets are known up front, so keep a window of result-page requests in flight
+            # and yield them back in order; the window bounds both memory and load on Confluence
+            offsets = iter(range(data["start"] + limit, total, limit))
+            with ThreadPoolExecutor(max_workers=PAGE_FETCH_WORKERS) as executor:
+                def submit(start):
+                    return executor.submit(self._get_json, url, {**params, "limit": limit, "start": start})
+                pending = collections.deque(submit(start) for start in islice(offsets, PAGE_FETCH_WORKERS))
+                while pending:
+                    page_data = pending.popleft().result()
+                    start = next(offsets, None)
+                    if start is not None:
+                        pending.append(submit(start))
+                    yield from page_data.get("results", [])
+            return
 
-            # check if a next page exists
+        # no totalSize/start (cursor pagination): follow the next links one at a time
+        while next_link:
+            data = self._get_json(f"https://{JIRA_DOMAIN}/wiki{next_link}")
+            # hand pages out as they arrive so only one response is held in memory
+            yield from data.get("results", [])
             next_link = data.get("_links", {}).get("next")
-            if not next_link:
-                break  # no more pages
 
-            # follow the next link
-            next_url = f"https://{JIRA_DOMAIN}/wiki{next_link}"
-            resp = requests.get(next_url, auth=self.auth)
-            data = resp.json()
-
-        return all_pages
+    def get_confluence_pages(self, space_key):
+        """Fetch all pages from a given Confluence space."""
+        return list(self.iter_confluence_pages(space_key))
 
     def extract_text(self, page):
         """Extract and clean text from a Confluence page."""
         raw_html = page["body"]["storage"]["value"]
-        soup = BeautifulSoup(raw_html, "html.parser")
+        if not raw_html:
+            return ""
+        # lxml is a C parser, several times faster than the pure-Python html.parser
+        soup = BeautifulSoup(raw_html, "lxml")
         return soup.get_text(separator="\n")  # clean text
 
     def safe_filename(self, name: str) -> str:
         """Generate a safe filename from a given string."""
-        # replace invalid characters with underscore
-        name = re.sub(r'[\\/*?:"<>|]', "_", name)
+        # normalize first so compatibility characters (e.g. fullwidth '／') are caught below
         name = unicodedata.normalize("NFKD", name)
-        name = re.sub(r'[\\/*?:"<>|]', "_", name)  # Windows-reserved
-        name = re.sub(r"\s+", " ", name).strip()
-        name = re.sub(r"[\U00010000-\U0010FFFF]", "", name)  # drop emoji/supplementary
+        name = name.translate(_INVALID_TRANS)
+        name = _WS_RE.sub(" ", name).strip()
+        name = _EMOJI_RE.sub("", name)
         return name
 
-    def write_confluence_data_to_file(self):
-        """Write all Confluence pages from specified spaces to text files."""
-        if not os.path.exists(File_Dir):
-            os.makedirs(File_Dir)
-        for space_key in Space_Keys:
-            pages = self.get_confluence_pages(space_key)
-            if not pages:
-                print(f"No pages found in space {space_key}")
-                continue
-            for page in pages:
-                text = self.extract_text(page)
-                print(page["title"])
-                title = self.safe_filename(page["title"])
-                url = page["_links"]["webui"]
-                text += f"\n URL:{url}"
-                with open(
-                    f"{File_Dir}/{title}.txt",
-                    "w",
-                    encoding="utf-8",
-                    errors="replace",
-                    newline="\n",
-                ) as f:
-                    f.write(text)
-        print(f"All confluence data written to files in '{File_Dir}' directory.")
+    def _claim_path(self, page, title):
+        """Pick the page's target file, adding its id when another page of this crawl already has the title."""
+        file_path = f"{File_Dir}/{title}.txt"
+        # spaces are crawled concurrently into the same directory, so claims are shared across them
+        with self._claimed_paths_lock:
+            owner = self._claimed_paths.setdefault(file_path, page["id"])
+            if owner != page["id"]:
+                file_path = f"{File_Dir}/{title} ({page['id']}).txt"
+                self._claimed_paths[file_path] = page["id"]
+        return file_path
+
+    def _process_page(self, page, file_path):
+        """Extract one page's text and write it to its file."""
+        text = self.extract_text(page)
+        url = page["_links"]["webui"]
+        # write to a temp file next to the target and swap it in, so a crash never leaves a half-written page
+        with tempfile.NamedTemporaryFile(
+            "w",
+            dir=File_Dir,
+            prefix=".",
+            suffix=".tmp",
+            delete=False,
+            encoding="utf-8",
+            errors="replace",
+            newline="\n",
+            buffering=WRITE_BUFFER_SIZE,
+        ) as f:
+            # write the URL line separately rather than copying the whole page text to append it
+            f.write(text)
+            f.write(f"\n URL:{url}")
+            tmp_path = f.name
+        try:
+            os.replace(tmp_path, file_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+        self.manifest[page["id"]] = {
+            "version": page.get("version", {}).get("number"),
+            "file": file_path,
+        }
+
+    def write_space_to_file(self, space_key, progress_callback=print):
+        """Write every page of one Confluence space to text files as it is fetched."""
+        page_count = 0
+        futures = []
+        seen_ids = set()
+        # parse + write in the background while the loop drives the next paged fetch
+        with ThreadPoolExecutor(max_workers=PAGE_WRITE_WORKERS) as executor:
+            try:
+                for page in self.iter_confluence_pages(space_key):
+                    if self._deadline_passed():
+                        raise CrawlDeadlineExceeded(space_key)
+                    # a space edited mid-crawl can return the same page on two result pages
+                    if page["id"] in seen_ids:
+                        continue
+                    seen_ids.add(page["id"])
+                    page_count += 1
+                    # an empty or all-emoji title would become ".txt", a dot file the ingest skips
+                    title = self.safe_filename(page["title"]) or page["id"]
+                    file_path = self._claim_path(page, title)
+                    # skip pages whose version hasn't changed since the last crawl
+                    if self.is_page_unchanged(page, file_path):
+                        continue
+                    futures.append(executor.submit(self._process_page, page, file_path))
+            except CrawlDeadlineExceeded:
+                # pages already queued are still written, so the manifest stays accurate
+                progress_callback(f"{space_key}: time limit reached, stopping after {page_count} pages")
+                self._stopped_early = True
+            # one progress line per batch of pages instead of a print per page from every worker
+            for written, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if written % PROGRESS_EVERY == 0:
+                    progress_callback(f"{space_key}: {written}/{len(futures)} pages written")
+        if not page_count:
+            progress_callback(f"No pages found in space {space_key}")
+        else:
+            progress_callback(f"{space_key}: {len(futures)} of {page_count} pages written, {page_count - len(futures)} unchanged")
+        return page_count
+
+    def write_confluence_data_to_file(self, progress_callback=print, timeout=None):
+        """
+        Write all Confluence pages from specified spaces to text files, reporting progress lines to progress_callback.
+        With a timeout (seconds) the crawl stops fetching once it is used up and keeps what was written.
+        Returns True if every space was crawled in full, False if the crawl stopped early or another was running.
+        """
+        if not self._crawl_lock.acquire(blocking=False):
+            progress_callback("A Confluence crawl is already running, skipping this one")
+            return False
+        try:
+            self._deadline = time.monotonic() + timeout if timeout is not None else None
+            self._stopped_early = False
+            self._claimed_paths = {}
+            os.makedirs(File_Dir, exist_ok=True)
+            self.load_manifest()
+            # Crawl spaces concurrently; each worker shares the pooled session
+            with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_FETCHES, len(Space_Keys)))) as executor:
+                list(executor.map(lambda key: self.write_space_to_file(key, progress_callback), Space_Keys))
+            self.save_manifest()
+            completed = not self._stopped_early
+            if completed:
+                progress_callback(f"All confluence data written to files in '{File_Dir}' directory.")
+            else:
+                progress_callback(f"Confluence crawl stopped at its time limit; partial data written to '{File_Dir}'.")
+            return completed
+        finally:
+            self._deadline = None
+            self._crawl_lock.release()
 
 
 if __name__ == "__main__":
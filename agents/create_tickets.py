@@ -1,103 +1,111 @@
 import requests
 import base64
+import re
+import functools
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from config import JIRA_DOMAIN, JIRA_EMAIL, JIRA_API_TOKEN
 
+MISSING_SECTIONS_MESSAGE = "❌ Please ensure the description includes 'User Story', 'Acceptance Criteria', and 'Scenarios' sections."
+BULK_CHUNK_SIZE = 50  # Jira accepts at most 50 issueUpdates per bulk request
+_SECTION_RE = re.compile(r"(User Story|Acceptance Criteria|Scenarios)")
+
+@functools.lru_cache(maxsize=64)
+def _basic_auth_header(email, token):
+    """Build (and cache per credential pair) the Basic auth header value."""
+    return "Basic " + base64.b64encode(f"{email}:{token}".encode()).decode()
+
+def _adf_panel(panel_type, text):
+    """Build one ADF panel holding a single paragraph of text."""
+    return {
+        "type": "panel",
+        "attrs": {"panelType": panel_type},
+        "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}]
+    }
+
 class JIRACreator:
     def __init__(self):
-        pass
+        # Reuse one pooled connection to Jira instead of a new TLS handshake per ticket
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount("https://", adapter)
+        self.default_auth_header = _basic_auth_header(JIRA_EMAIL, JIRA_API_TOKEN)
 
-    # --- Function to create Jira issue ---
-    def create_ticket(summary, description, issue_type, email, API_token, project_key):
-        if not summary or not description or not issue_type or not project_key:
-            return "❌ All fields are required."
-        
+    def _get_headers(self, email, API_token):
+        """Build request headers using the user's credentials or the default account."""
         if not email or not API_token:
             print("default auth")
-            auth = base64.b64encode(f"{JIRA_EMAIL}:{JIRA_API_TOKEN}".encode()).decode()
+            auth_header = self.default_auth_header
         else:
             print("user_auth")
-            auth = base64.b64encode(f"{email}:{API_token}".encode()).decode()
+            auth_header = _basic_auth_header(email, API_token)
+        return {
+            "Authorization": auth_header,
+            "Content-Type": "application/json"
+        }
+
+    def _split_description(self, description):
+        """Split the generated description into user story, acceptance criteria and scenarios."""
+        # One pass over the text; each section runs until the next section heading
+        sections = {}
+        current = None
+        for part in _SECTION_RE.split(description):
+            if part in ("User Story", "Acceptance Criteria", "Scenarios") and part not in sections:
+                current = part
+                sections[current] = [part]
+            elif current is not None:
+                sections[current].append(part)
+
+        user_story = "".join(sections.get("User Story", [])).strip()
+        acceptance_criteria = "".join(sections.get("Acceptance Criteria", [])).strip()
+        testing = "".join(sections.get("Scenarios", [])).strip()
+        if not user_story or not acceptance_criteria or not testing:
+            return None
+        return user_story, acceptance_criteria, testing
+
+    def _build_adf_description(self, user_story, acceptance_criteria, testing):
+        """Format description as Atlassian Document Format (ADF)."""
+        return {
+            "type": "doc",
+            "version": 1,
+            "content": [
+                _adf_panel("info", user_story),
+                _adf_panel("success", acceptance_criteria),
+                _adf_panel("note", testing)
+            ]
+        }
+
+    def _build_fields(self, summary, description, issue_type, project_key):
+        """Build the issue fields for a ticket, or None if the description is malformed."""
+        sections = self._split_description(description)
+        if sections is None:
+            return None
+        return {
+            "project": {"key": project_key},
+            "summary": summary,
+            "description": self._build_adf_description(*sections),
+            "issuetype": {"name": issue_type}
+        }
+
+    # --- Function to create Jira issue ---
+    def create_ticket(self, summary, description, issue_type, email, API_token, project_key):
+        if not summary or not description or not issue_type or not project_key:
+            return "❌ All fields are required."
+        
+        headers = self._get_headers(email, API_token)
         try:
             url = f"https://{JIRA_DOMAIN}/rest/api/3/issue"
-            headers = {
-                "Authorization": f"Basic {auth}",
-                "Content-Type": "application/json"
-            }
-            try:
-                first_index = description.index("User Story")
-                second_index = description.index("Acceptance Criteria")
-                third_index = description.index("Scenarios")
-
-                user_story = description[first_index:second_index].strip()
-                acceptance_criteria = description[second_index:third_index].strip()
-                testing = description[third_index:].strip()
-                if not user_story or not acceptance_criteria or not testing:
-                    return "❌ Please ensure the description includes 'User Story', 'Acceptance Criteria', and 'Scenarios' sections."
-            except Exception as e:
-                return "❌ Please ensure the description includes 'User Story', 'Acceptance Criteria', and 'Scenarios' sections."
-            
-            # Format description as Atlassian Document Format (ADF)
-            adf_description = {
-                "type": "doc",
-                "version": 1,
-                "content": [
-                    {
-                        "type": "panel",
-                        "attrs": {"panelType": "info"},
-                        "content": [
-                            {
-                                "type": "paragraph",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": user_story
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        "type": "panel",
-                        "attrs": {"panelType": "success"},
-                        "content": [
-                            {
-                                "type": "paragraph",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": acceptance_criteria
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        "type": "panel",
-                        "attrs": {"panelType": "note"},
-                        "content": [
-                            {
-                                "type": "paragraph",
-                                "content": [
-                                    {
-                                        "type": "text",
-                                        "text": testing
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-            payload = {
-                "fields": {
-                    "project": {"key": project_key},
-                    "summary": summary,
-                    "description": adf_description,
-                    "issuetype": {"name": issue_type}
-                }
-            }
+            fields = self._build_fields(summary, description, issue_type, project_key)
+            if fields is None:
+                return MISSING_SECTIONS_MESSAGE
+            payload = {"fields": fields}
         
-            response = requests.post(url, headers=headers, json=payload, verify=False)
+            response = self.session.post(url, headers=headers, data=orjson.dumps(payload), timeout=(3.05, 30))
 
             if response.status_code == 201:
                 issue_key = response.json()["key"]
@@ -105,4 +113,67 @@ class JIRACreator:
             else:
                 return f"❌ Failed: {response.status_code} - {response.text}"
         except Exception as e:
-            return f"❌ Error: {str(e)}"
\ No newline at end of file
+            return f"❌ Error: {str(e)}"
+
+    # --- Function to create many Jira issues in bulk ---
+    def create_tickets_bulk(self, tickets, email=None, API_token=None):
+        """
+        Create many tickets using Jira's bulk endpoint, 50 issues per request.
+
+        Args:
+            tickets: List of dicts with summary, description, issue_type and project_key
+            email: Optional user email, falls back to the default account
+            API_token: Optional user API token, falls back to the default account
+
+        Returns:
+            List of result messages, one per input ticket in the same order
+        """
+        results = [None] * len(tickets)
+        pending = []  # (input index, fields) for tickets that passed validation
+        for i, ticket in enumerate(tickets):
+            summary = ticket.get("summary")
+            description = ticket.get("description")
+            issue_type = ticket.get("issue_type")
+            project_key = ticket.get("project_key")
+            if not summary or not description or not issue_type or not project_key:
+                results[i] = "❌ All fields are required."
+                continue
+            fields = self._build_fields(summary, description, issue_type, project_key)
+            if fields is None:
+                results[i] = MISSING_SECTIONS_MESSAGE
+                continue
+            pending.append((i, fields))
+
+        if not pending:
+            return results
+
+        headers = self._get_headers(email, API_token)
+        url = f"https://{JIRA_DOMAIN}/rest/api/3/issue/bulk"
+        for start in range(0, len(pending), BULK_CHUNK_SIZE):
+            chunk = pending[start:start + BULK_CHUNK_SIZE]
+            payload = {"issueUpdates": [{"fields": fields} for _, fields in chunk]}
+            try:
+                response = self.session.post(url, headers=headers, data=orjson.dumps(payload), timeout=(3.05, 60))
+                if response.status_code not in (200, 201):
+                    for i, _ in chunk:
+                        results[i] = f"❌ Failed: {response.status_code} - {response.text}"
+                    continue
+
+                response_data = orjson.loads(response.content)
+                # failedElementNumber is the position within this chunk
+                failed = {
+                    error.get("failedElementNumber"): error
+                    for error in response_data.get("errors", [])
+                }
+                created = iter(response_data.get("issues", []))
+                for position, (i, _) in enumerate(chunk):
+                    if position in failed:
+                        details = failed[position].get("elementErrors", {})
+                        results[i] = f"❌ Failed: {failed[position].get('status', '')} - {details}"
+                    else:
+                        issue = next(created, None)
+                        results[i] = f"✅ Ticket created: {issue['key']}" if issue else "❌ Failed: no issue returned"
+            except Exception as e:
+                for i, _ in chunk:
+                    results[i] = f"❌ Error: {str(e)}"
+        return results
@@ -1,17 +1,374 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import random
 import re
 import sys
 from typing import Dict, List, Optional, Tuple
 import base64
 from urllib.parse import urlparse
-import json
+import orjson
+import tiktoken
+import time
+import functools
+import hashlib
+import heapq
+import tempfile
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for config import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Azure_DevOps_Token, OPENAI_KEY, IC_OpenAI_URL
 
+# Precompiled patterns used across the analysis helpers
+# Format: https://dev.azure.com/{organization}/{project}/_git/{repository}
+_AZURE_URL_PATTERNS = [
+    re.compile(r'dev\.azure\.com/([\w\-\.]+)/([\w\-\.]+)/_git/([\w\-\.]+)/?$', re.IGNORECASE),
+    re.compile(r'([\w\-\.]+)\.visualstudio\.com/([\w\-\.]+)/_git/([\w\-\.]+)/?$', re.IGNORECASE)
+]
+# File references in error text; each pattern is applied separately and the matches are unioned
+_MENTIONED_FILE_PATTERNS = (
+    re.compile(r'\\([^\\]+\.(?:cs|vb|aspx|ascx|config|json|xml))', re.IGNORECASE),  # Windows paths
+    re.compile(r'/([^/]+\.(?:cs|vb|aspx|ascx|config|json|xml))', re.IGNORECASE),   # Unix paths
+    re.compile(r'([A-Za-z][A-Za-z0-9_]*\.(?:cs|vb|aspx|ascx|config|json|xml))', re.IGNORECASE),  # File names
+)
+_KEYWORD_RE = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b')
+_LONG_KEYWORD_RE = re.compile(r'\b[a-zA-Z_][a-zA-Z0-9_]{3,}\b')  # keywords longer than 3 characters
+_CLASS_RE = re.compile(r'\b[A-Z][a-zA-Z0-9]*\b')  # PascalCase class/namespace names
+_CONFIG_EXTENSIONS = ('.config', '.json', '.xml')
+_CODE_EXTENSIONS = ('.cs', '.vb')
+
+
+def _mentioned_files(error_message: str) -> set:
+    """
+    Collect file names referenced in an error message.
+    
+    Args:
+        error_message: Error message or stack trace
+        
+    Returns:
+        Set of every match of each file pattern
+    """
+    mentioned = set()
+    for pattern in _MENTIONED_FILE_PATTERNS:
+        mentioned.update(pattern.findall(error_message))
+    return mentioned
+
+
+def _substring_matcher(patterns, flags: int = 0) -> Optional[re.Pattern]:
+    """
+    Compile lowercase substrings into one alternation so a single search
+    tells whether any of them occurs. Returns None when there is nothing to match.
+    """
+    alternatives = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+    if not alternatives:
+        return None
+    return re.compile('|'.join(map(re.escape, alternatives)), flags)
+
+@functools.lru_cache(maxsize=32)
+def _split_project_repo(project_repo: str) -> Optional[Tuple[str, str]]:
+    """Split 'project/repo' into its two parts, or return None if the format is invalid."""
+    parts = project_repo.split('/')
+    return (parts[0], parts[1]) if len(parts) == 2 else None
+
+# Kept byte-for-byte stable across calls so the service can reuse the cached prompt prefix
+_FILE_SELECTION_SYSTEM_PROMPT = """You are a code analysis expert that helps identify relevant files for error analysis.
+
+The user message is a JSON object with "error" (the error message to analyze), "files" (the available file paths in the repository) and "max_files" (how many files to select at most).
+
+ANALYSIS INSTRUCTIONS:
+1. Look for files whose names contain keywords from the error message
+2. If the error mentions specific classes, methods, or namespaces, find files likely to contain them
+3. Consider the error type (e.g., NullReferenceException, SqlException) and find related files
+4. Look for configuration files if the error seems configuration-related
+5. Include entry points (Program.cs, Startup.cs) only if the error occurs during startup
+
+IMPORTANT: Base your selection ONLY on the specific error message provided, not on generic .NET patterns.
+
+Return ONLY a JSON array of the most relevant file paths without any additional text:
+["path/to/relevant/file1.cs", "path/to/relevant/file2.cs"]"""
+
+_ANALYSIS_SYSTEM_PROMPT = "You are an expert .NET developer and error analysis specialist. Provide detailed, actionable root cause analysis for software errors. Focus on practical solutions and specific code fixes."
+
+_ANALYSIS_PROMPT_TEMPLATE = """You are an expert .NET developer and error analysis specialist. Analyze the following error message and related code files to provide a comprehensive root cause analysis.
+
+{context}
+
+Please provide a detailed analysis following this structure:
+
+# Root Cause Analysis
+
+## Error Summary
+Provide a clear, concise summary of what the error means and where it occurs.
+
+## Root Cause Identification
+1. **Primary Cause**: Identify the most likely root cause based on the error message and code
+2. **Contributing Factors**: List any secondary issues that may have contributed
+3. **Code Location**: Pinpoint the exact location and line where the problem occurs
+
+## Code Analysis
+- Analyze the specific code patterns that led to this error
+- Identify any anti-patterns or problematic implementations
+- Review variable initialization, null checks, and object lifecycle
+
+## Immediate Fixes
+Provide specific, actionable code changes to fix this error:
+```csharp
+// Example fix with actual code snippets
+```
+
+## Prevention Strategies
+- Suggest coding practices to prevent similar errors
+- Recommend additional validation or error handling
+- Identify areas for refactoring or improvement
+
+## Testing Recommendations
+- Suggest specific test cases to verify the fix
+- Recommend integration tests or scenarios to prevent regression
+
+## Additional Considerations
+- Performance implications of the fix
+- Security considerations if applicable
+- Compatibility with existing code
+
+Focus on practical, implementable solutions specific to this error and codebase."""
+
+# Sections of the analysis context; kept free of indentation, which only costs prompt tokens
+_FILE_HEADER_TEMPLATE = "--- FILE: {path} ---\n"
+_FILE_TRUNCATED_TEMPLATE = (
+    "--- FILE: {path} (TRUNCATED - {total} chars total) ---\n"
+    "{content}\n"
+    "[... content truncated for token limit ...]\n\n"
+)
+_FILE_DUPLICATE_TEMPLATE = "--- FILE: {path} (duplicate of {original}) ---\n\n"
+_FILES_OMITTED_TEMPLATE = (
+    "--- ADDITIONAL FILES OMITTED DUE TO TOKEN LIMIT ---\n"
+    "{count} more files were analyzed but omitted from context to stay within token limits.\n"
+    "Files omitted: {paths}\n\n"
+)
+
+_CODE_LINE_RE = _substring_matcher(
+    ('public', 'private', 'class', 'method', 'function', 'sub ', 'dim ', 'if ', 'try', 'catch', 'throw'), re.IGNORECASE
+)
+_CONFIG_LINE_RE = _substring_matcher(
+    ('config', 'connection', 'setting', 'import', 'using', 'namespace'), re.IGNORECASE
+)
+
+
+def _score_line(line: str, keyword_re: Optional[re.Pattern]) -> int:
+    """Relevance of a source line to the error, used when truncating large files."""
+    score = 0
+    
+    # Higher score for each distinct error keyword on the line
+    if keyword_re is not None:
+        score += 10 * len({match.lower() for match in keyword_re.findall(line)})
+    
+    # Score for important code patterns
+    if _CODE_LINE_RE.search(line):
+        score += 3
+    
+    # Score for configuration and important declarations
+    if _CONFIG_LINE_RE.search(line):
+        score += 2
+    
+    return score
+
+
+LINE_SCORE_CACHE_SIZE = 256  # (content digest, keywords, skip) -> scores of the relevant lines
+_line_score_cache = OrderedDict()
+_line_score_cache_lock = threading.Lock()
+
+
+def _scored_lines(content: str, error_keywords: Tuple[str, ...], skip_lines: int) -> Tuple[Tuple[str, ...], List[Tuple[int, str, int]]]:
+    """
+    Split content into lines and score every line after the first skip_lines.
+    Scores are cached by a digest of the content, so the same file analyzed again for a
+    similar error isn't rescored and the cache never holds on to file bodies.
+    """
+    lines = tuple(content.split('\n'))
+    key = (hashlib.blake2b(content.encode('utf-8', 'ignore'), digest_size=16).digest(), error_keywords, skip_lines)
+    with _line_score_cache_lock:
+        scores = _line_score_cache.get(key)
+        if scores is not None:
+            _line_score_cache.move_to_end(key)
+    if scores is None:
+        keyword_re = _substring_matcher(error_keywords, re.IGNORECASE)
+        scores = []
+        for i in range(min(skip_lines, len(lines)), len(lines)):
+            score = _score_line(lines[i], keyword_re)
+            if score > 0:
+                scores.append((i, score))
+        scores = tuple(scores)
+        with _line_score_cache_lock:
+            _line_score_cache[key] = scores
+            if len(_line_score_cache) > LINE_SCORE_CACHE_SIZE:
+                _line_score_cache.popitem(last=False)
+    return lines, [(i, lines[i], score) for i, score in scores]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """Tokenizer for context budgeting; None if it can't be loaded (e.g. offline without a cached BPE file)."""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable, estimating tokens from characters: {e}")
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Number of tokens in text, falling back to the 1 token ≈ 4 characters estimate."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+FILE_TOKEN_CACHE_SIZE = 1024  # per-file token counts kept, keyed by content digest
+_file_token_cache = OrderedDict()
+_file_token_cache_lock = threading.Lock()
+
+
+def _count_file_tokens(content: str, digest: bytes) -> int:
+    """
+    Token count of one file's content, cached by its digest so repeat analyses of the
+    same files skip re-encoding without the cache holding on to the content itself.
+    
+    Args:
+        content: File content to count
+        digest: Content digest used as the cache key
+        
+    Returns:
+        Number of tokens in content
+    """
+    with _file_token_cache_lock:
+        count = _file_token_cache.get(digest)
+        if count is not None:
+            _file_token_cache.move_to_end(digest)
+            return count
+    count = _count_tokens(content)
+    with _file_token_cache_lock:
+        _file_token_cache[digest] = count
+        if len(_file_token_cache) > FILE_TOKEN_CACHE_SIZE:
+            _file_token_cache.popitem(last=False)
+    return count
+
+
+def _allocate_budgets(sizes: List[int], total: int, cap: int) -> List[int]:
+    """
+    Split total between items max-min fairly: items smaller than their share keep
+    their full size and the surplus goes to larger items; no budget exceeds cap.
+    """
+    budgets = [0] * len(sizes)
+    remaining = max(0, total)
+    order = sorted(range(len(sizes)), key=sizes.__getitem__)
+    for n, i in enumerate(order):
+        budgets[i] = min(sizes[i], cap, remaining // (len(sizes) - n))
+        remaining -= budgets[i]
+    return budgets
+
+SECTION_OVERHEAD_TOKENS = 32  # per-file header/footer tokens reserved when sharing the context budget
+AZURE_TIMEOUT = (5, 30)  # (connect, read) seconds for Azure DevOps REST calls
+AI_TIMEOUT = (3.05, 120)  # (connect, read) seconds for Azure OpenAI calls, so a hung call frees its AI slot
+MAX_FETCH_WORKERS = 16  # concurrent Azure DevOps requests per fan-out
+MAX_IN_FLIGHT_REQUESTS = 16  # global cap across nested fan-outs, to stay under service throttling
+MAX_CONCURRENT_AI_REQUESTS = int(os.getenv("MAX_AI_CONCURRENCY", "8"))  # long OpenAI calls get their own cap
+RATE_LIMIT_LOW_WATER = 50  # pause new requests when X-RateLimit-Remaining drops below this
+MAX_RATE_LIMIT_PAUSE = 30  # seconds
+
+CACHE_DIR = '.ea_cache'  # on-disk cache of Azure DevOps responses, shared across runs
+CACHE_MAX_BYTES = int(os.getenv("EA_CACHE_MAX_MB", "256")) * 1024 * 1024  # oldest entries are evicted past this
+HEAD_CONTENT_TTL = 15 * 60  # file content at HEAD can change; commit-pinned content never expires
+STRUCTURE_TTL = 5 * 60
+
+
+class _DiskCache:
+    """
+    Small SHA1-keyed JSON file cache with optional per-entry expiry.
+    Total size is capped at max_bytes; past it the oldest entries by mtime are removed on write.
+    Failures to read or write are treated as cache misses.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # bytes on disk, scanned on the first write and tracked after that
+        self._size_lock = threading.Lock()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+    
+    def get(self, key: str):
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        expires = entry.get('expires')
+        if expires is not None and expires < time.time():
+            return None
+        return entry.get('value')
+    
+    def set(self, key: str, value, expire: Optional[float] = None):
+        entry = {'expires': time.time() + expire if expire else None, 'value': value}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            data = orjson.dumps(entry)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            path = self._path(key)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write cache entry: {e}")
+            return
+        with self._size_lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+    
+    def _scan(self):
+        """List (mtime, size, path) for every entry, with their total size."""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for e in it:
+                    if e.name.endswith('.json'):
+                        try:
+                            st = e.stat()
+                        except OSError:
+                            continue  # removed by another process meanwhile
+                        entries.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            pass
+        return entries, sum(size for _, size, _ in entries)
+    
+    def _evict(self):
+        """Remove the oldest entries until the cache is back under 90% of max_bytes."""
+        # rescan rather than trust the running total, other processes share the directory
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        for mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
 
 class ErrorAnalyzer:
     """
@@ -19,12 +376,75 @@ class ErrorAnalyzer:
     Supports Azure DevOps repositories for code analysis.
     """
     
-    def __init__(self):
+    def __init__(self, session: Optional[requests.Session] = None):
+        """
+        Args:
+            session: Optional shared HTTP session; a pooled session with retries is built if omitted
+        """
         self.azure_devops_token = Azure_DevOps_Token  # Personal Access Token for Azure DevOps
+        # Basic auth header for Azure DevOps, built once; kept off the session so it never reaches OpenAI
+        self._azure_headers = {}
+        if self.azure_devops_token:
+            credentials = base64.b64encode(f':{self.azure_devops_token}'.encode()).decode()
+            self._azure_headers['Authorization'] = f'Basic {credentials}'
+        # Shared keep-alive session so repeated calls to dev.azure.com reuse connections
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=32,
+                pool_maxsize=32,
+                max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self._session = session
+        self._request_slots = threading.BoundedSemaphore(MAX_IN_FLIGHT_REQUESTS)
+        self._ai_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_AI_REQUESTS)
+        self._throttled_until = 0.0
+        self._cache = _DiskCache(CACHE_DIR)
         self.supported_extensions = {
           '.js', '.ts', '.cs', '.vb', '.aspx', '.ascx', '.xml', '.config', '.json',
-          '.xml', '.csproj', '.vbproj', '.sln', '.sql'
+          '.csproj', '.vbproj', '.sln', '.sql'
         }
+        # str.endswith takes a tuple, checking every suffix in one call
+        self._supported_ext_tuple = tuple(self.supported_extensions)
+    
+    def _request(self, method: str, url: str, slots: Optional[threading.BoundedSemaphore] = None,
+                 **kwargs) -> requests.Response:
+        """
+        Send a request through the shared session with a bound on in-flight calls.
+        
+        Status retries (including Retry-After on 429/503) are handled by the session's
+        Retry policy; this adds a shared pause when Azure DevOps reports that the
+        rate limit is nearly used up, so the other workers back off too.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            slots: Semaphore bounding this kind of call (defaults to the shared request slots)
+            **kwargs: Passed through to requests.Session.request
+            
+        Returns:
+            The response object
+        """
+        pause = self._throttled_until - time.time()
+        if pause > 0:
+            time.sleep(pause)
+        
+        with slots or self._request_slots:
+            response = self._session.request(method, url, **kwargs)
+        
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            try:
+                if float(remaining) < RATE_LIMIT_LOW_WATER:
+                    reset = float(response.headers.get('X-RateLimit-Reset', 0))
+                    wait = min(MAX_RATE_LIMIT_PAUSE, max(1.0, reset - time.time())) + random.random()
+                    print(f"⏳ Azure DevOps rate limit nearly reached ({remaining} left), pausing {wait:.1f}s")
+                    self._throttled_until = max(self._throttled_until, time.time() + wait)
+            except ValueError:
+                pass
+        return response
     
     def parse_repo_url(self, repo_url: str) -> Optional[Tuple[str, str]]:
         """
@@ -37,16 +457,19 @@ class ErrorAnalyzer:
             Tuple of (organization, project/repo) or None if invalid
         """
         try:
-            # Handle Azure DevOps URL formats
-            # Format: https://dev.azure.com/{organization}/{project}/_git/{repository}
-            azure_patterns = [
-                r'dev\.azure\.com/([\w\-\.]+)/([\w\-\.]+)/_git/([\w\-\.]+)/?$',
-                r'([\w\-\.]+)\.visualstudio\.com/([\w\-\.]+)/_git/([\w\-\.]+)/?$'
-            ]
+            # Fast path for well-formed https URLs; no regex needed
+            parsed = urlparse(repo_url.strip())
+            host = parsed.hostname or ''  # lowercased, without user info (org@dev.azure.com) or port
+            parts = [segment for segment in parsed.path.split('/') if segment]
+            if host == 'dev.azure.com' and len(parts) == 4 and parts[2] == '_git':
+                return parts[0], f"{parts[1]}/{parts[3]}"
+            if host.endswith('.visualstudio.com') and len(parts) == 3 and parts[1] == '_git':
+                return parsed.netloc.rsplit('@', 1)[-1].split('.')[0], f"{parts[0]}/{parts[2]}"
             
-            for pattern in azure_patterns:
+            # Handle Azure DevOps URL formats
+            for pattern in _AZURE_URL_PATTERNS:
                 # Use original URL (not lowercased) to preserve case sensitivity
-                match = re.search(pattern, repo_url, re.IGNORECASE)
+                match = pattern.search(repo_url)
                 if match:
                     if 'dev.azure.com' in repo_url.lower():
                         org, project, repo = match.groups()
@@ -60,7 +483,7 @@ class ErrorAnalyzer:
             print(f"Error parsing repo URL: {e}")
             return None
     
-    def get_repo_structure(self, owner: str, repo: str, path: str = "") -> Dict:
+    def get_repo_structure(self, owner: str, repo: str, path: str = "", recursion: str = "OneLevel") -> Dict:
         """
         Get repository file structure using Azure DevOps API.
         
@@ -68,21 +491,28 @@ class ErrorAnalyzer:
             owner: Repository owner/organization
             repo: Repository name (project/repo format)
             path: Path within repository (optional)
+            recursion: Azure DevOps recursionLevel ('OneLevel' or 'Full')
             
         Returns:
             Dictionary containing file structure
         """
-        return self._get_azure_repo_structure(owner, repo, path)
+        return self._get_azure_repo_structure(owner, repo, path, recursion)
     
-    def _get_azure_repo_structure(self, organization: str, project_repo: str, path: str = "") -> Dict:
+    def _get_azure_repo_structure(self, organization: str, project_repo: str, path: str = "",
+                                  recursion: str = "OneLevel") -> Dict:
         """Get Azure DevOps repository structure."""
+        cache_key = f"structure:{organization}/{project_repo}/{path}/{recursion}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         # Parse project and repo from project_repo
-        parts = project_repo.split('/')
-        if len(parts) != 2:
+        project_and_repo = _split_project_repo(project_repo)
+        if project_and_repo is None:
             print(f"❌ Invalid Azure repo format: {project_repo}")
             return {}
         
-        project, repo = parts
+        project, repo = project_and_repo
         
         # Azure DevOps REST API URL
         base_url = f"https://dev.azure.com/{organization}/{project}/_apis/git/repositories/{repo}/items"
@@ -90,22 +520,15 @@ class ErrorAnalyzer:
         params = {
             'api-version': '7.0',
             'scopePath': f'/{path}' if path else '/',
-            'recursionLevel': 'OneLevel'
+            'recursionLevel': recursion
         }
         
-        headers = {}
-        if self.azure_devops_token:
-            # Use Basic authentication with PAT
-            import base64
-            credentials = base64.b64encode(f':{self.azure_devops_token}'.encode()).decode()
-            headers['Authorization'] = f'Basic {credentials}'
-        
         try:
             print(f"🔍 Fetching repo structure: {organization}/{project}/{repo}")
             if path:
                 print(f"📁 Path: {path}")
             
-            response = requests.get(base_url, headers=headers, params=params)
+            response = self._request('GET', base_url, headers=self._azure_headers, params=params, timeout=AZURE_TIMEOUT)
             
             # Add detailed error information
             if response.status_code == 404:
@@ -125,7 +548,7 @@ class ErrorAnalyzer:
             response.raise_for_status()
             
             # Convert Azure DevOps format to GitHub-like format for compatibility
-            azure_data = response.json()
+            azure_data = orjson.loads(response.content)
             converted_data = []
             
             for item in azure_data.get('value', []):
@@ -145,6 +568,7 @@ class ErrorAnalyzer:
                     })
             
             print(f"✅ Found {len(converted_data)} items in repository structure")
+            self._cache.set(cache_key, converted_data, expire=STRUCTURE_TTL)
             return converted_data
             
         except requests.exceptions.RequestException as e:
@@ -152,7 +576,8 @@ class ErrorAnalyzer:
             print(f"   Repository: {organization}/{project}/{repo}")
             return {}
     
-    def get_file_content(self, owner: str, repo: str, file_path: str) -> Optional[str]:
+    def get_file_content(self, owner: str, repo: str, file_path: str, commit_id: Optional[str] = None,
+                         max_bytes: Optional[int] = None) -> Optional[str]:
         """
         Get content of a specific file from Azure DevOps repository.
         
@@ -160,21 +585,31 @@ class ErrorAnalyzer:
             owner: Repository owner/organization
             repo: Repository name (project/repo format)
             file_path: Path to the file
+            commit_id: Optional commit to read the file at (defaults to HEAD)
+            max_bytes: Optional limit on how much of the file to download
             
         Returns:
             File content as string or None if error
         """
-        return self._get_azure_file_content(owner, repo, file_path)
+        return self._get_azure_file_content(owner, repo, file_path, commit_id, max_bytes)
     
-    def _get_azure_file_content(self, organization: str, project_repo: str, file_path: str) -> Optional[str]:
+    def _get_azure_file_content(self, organization: str, project_repo: str, file_path: str, commit_id: Optional[str] = None,
+                                max_bytes: Optional[int] = None) -> Optional[str]:
         """Get file content from Azure DevOps."""
+        # Content at a given commit is immutable, so it can be cached forever
+        cache_key = f"content:{organization}/{project_repo}/{commit_id or 'HEAD'}/{file_path}/{max_bytes or 'all'}"
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            print(f"📦 Cache hit for file content: {file_path}")
+            return cached
+        
         # Parse project and repo
-        parts = project_repo.split('/')
-        if len(parts) != 2:
+        project_and_repo = _split_project_repo(project_repo)
+        if project_and_repo is None:
             print(f"Invalid project_repo format: {project_repo}")
             return None
         
-        project, repo = parts
+        project, repo = project_and_repo
         
         # Azure DevOps REST API URL for file content
         url = f"https://dev.azure.com/{organization}/{project}/_apis/git/repositories/{repo}/items"
@@ -184,19 +619,23 @@ class ErrorAnalyzer:
             'path': f'/{file_path}',
             'includeContent': 'true'
         }
+        if commit_id:
+            params['versionDescriptor.version'] = commit_id
+            params['versionDescriptor.versionType'] = 'commit'
         
-        headers = {}
-        if self.azure_devops_token:
-            import base64
-            credentials = base64.b64encode(f':{self.azure_devops_token}'.encode()).decode()
-            headers['Authorization'] = f'Basic {credentials}'
+        # Ask for raw text so the body needs neither a JSON parse nor a base64 decode
+        params['$format'] = 'text'
+        headers = {**self._azure_headers, 'Accept': 'text/plain'}
+        if max_bytes is not None:
+            # Only the first max_bytes bytes have to be transferred
+            headers['Range'] = f'bytes=0-{max_bytes - 1}'
         
         try:
             print(f"🔍 Fetching file content: {organization}/{project}/{repo} -> {file_path}")
             print(f"📡 Request URL: {url}")
             print(f"📋 Parameters: {params}")
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=headers, params=params, timeout=AZURE_TIMEOUT)
             
             # Add detailed error information
             if response.status_code == 404:
@@ -219,23 +658,28 @@ class ErrorAnalyzer:
             content_type = response.headers.get('content-type', '').lower()
             
             if 'application/json' in content_type:
-                # JSON response with structured data
-                file_data = response.json()
+                # Azure DevOps may still answer with structured data
+                file_data = orjson.loads(response.content)
                 content = file_data.get('content', '')
                 
                 # Handle different encoding types
                 if file_data.get('contentMetadata', {}).get('encoding') == 'base64':
                     content = base64.b64decode(content).decode('utf-8', errors='ignore')
+                if max_bytes is not None:
+                    content = content[:max_bytes]
             else:
-                # Raw text content (what we're actually getting)
-                content = response.text
-                # Remove BOM if present
-                if content.startswith('\ufeff'):
-                    content = content[1:]
-                elif content.startswith('ï»¿'):
-                    content = content[3:]  # Remove UTF-8 BOM bytes
+                # Raw text content (what we're actually getting). Decode the bytes directly:
+                # utf-8-sig drops a BOM, and there's no charset sniffing or latin-1 fallback
+                # (text/plain without a charset otherwise decodes a BOM as 'ï»¿')
+                raw = response.content
+                if max_bytes is not None:
+                    # Servers that ignore Range still send the whole file, so cut it here;
+                    # a multibyte character split at the boundary is dropped
+                    raw = raw[:max_bytes]
+                content = raw.decode('utf-8-sig', errors='ignore')
             
             print(f"✅ Successfully fetched file content: {file_path} ({len(content)} characters)")
+            self._cache.set(cache_key, content, expire=None if commit_id else HEAD_CONTENT_TTL)
             return content
             
         except Exception as e:
@@ -257,11 +701,11 @@ class ErrorAnalyzer:
             List of commits with metadata
         """
         # Parse project and repo
-        parts = project_repo.split('/')
-        if len(parts) != 2:
+        project_and_repo = _split_project_repo(project_repo)
+        if project_and_repo is None:
             return []
         
-        project, repo = parts
+        project, repo = project_and_repo
         
         # Calculate date threshold
         since_date = (datetime.now() - timedelta(days=days)).isoformat() + 'Z'
@@ -275,17 +719,11 @@ class ErrorAnalyzer:
             '$top': 100  # Limit to recent 100 commits
         }
         
-        headers = {}
-        if self.azure_devops_token:
-            import base64
-            credentials = base64.b64encode(f':{self.azure_devops_token}'.encode()).decode()
-            headers['Authorization'] = f'Basic {credentials}'
-        
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=self._azure_headers, params=params, timeout=AZURE_TIMEOUT)
             response.raise_for_status()
             
-            commits_data = response.json()
+            commits_data = orjson.loads(response.content)
             return commits_data.get('value', [])
             
         except Exception as e:
@@ -305,11 +743,11 @@ class ErrorAnalyzer:
             List of changed files
         """
         # Parse project and repo
-        parts = project_repo.split('/')
-        if len(parts) != 2:
+        project_and_repo = _split_project_repo(project_repo)
+        if project_and_repo is None:
             return []
         
-        project, repo = parts
+        project, repo = project_and_repo
         
         # Azure DevOps REST API URL for commit changes
         url = f"https://dev.azure.com/{organization}/{project}/_apis/git/repositories/{repo}/commits/{commit_id}/changes"
@@ -318,17 +756,11 @@ class ErrorAnalyzer:
             'api-version': '7.0'
         }
         
-        headers = {}
-        if self.azure_devops_token:
-            import base64
-            credentials = base64.b64encode(f':{self.azure_devops_token}'.encode()).decode()
-            headers['Authorization'] = f'Basic {credentials}'
-        
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = self._request('GET', url, headers=self._azure_headers, params=params, timeout=AZURE_TIMEOUT)
             response.raise_for_status()
             
-            changes_data = response.json()
+            changes_data = orjson.loads(response.content)
             return changes_data.get('changes', [])
             
         except Exception as e:
@@ -359,15 +791,21 @@ class ErrorAnalyzer:
         # Collect all changed files from recent commits
         changed_files = {}  # Use dict to avoid duplicates
         
-        for commit in recent_commits:
+        # Fetch every commit's changes concurrently; ex.map keeps commit order so the
+        # newest commit still wins when the single-threaded merge below dedups paths
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as ex:
+            all_changes = list(ex.map(
+                lambda c: self.get_commit_changes(owner, repo, c.get('commitId', '')),
+                recent_commits
+            ))
+        
+        for commit, changes in zip(recent_commits, all_changes):
             commit_id = commit.get('commitId', '')
             commit_message = commit.get('comment', '')
             commit_date = commit.get('author', {}).get('date', '')
             
             # print(f"Processing commit: {commit_id[:8]} - {commit_message[:50]}...")
             
-            changes = self.get_commit_changes(owner, repo, commit_id)
-            
             for change in changes:
                 item = change.get('item', {})
                 if item.get('gitObjectType') == 'blob':  # Only files, not directories
@@ -375,7 +813,7 @@ class ErrorAnalyzer:
                     file_name = file_path.split('/')[-1] if file_path else ''
                     
                     # Check if file extension is supported
-                    if any(file_name.endswith(ext) for ext in self.supported_extensions):
+                    if file_name.endswith(self._supported_ext_tuple):
                         if file_path not in changed_files:
                             changed_files[file_path] = {
                                 'path': file_path,
@@ -420,17 +858,28 @@ class ErrorAnalyzer:
         # Use AI to determine which recently changed files are most relevant to the error
         relevant_file_paths = self.ai_select_relevant_files(recently_changed_files, error_message, max_files)
         
-        # Get content for the selected files
+        # Limit individual file content to prevent token overflow
+        MAX_FILE_CONTENT = 10000  # characters
+        
+        # Get content for the selected files, pinned to the commit that last changed each one;
+        # only download enough bytes to fill the character budget (multibyte text needs up to 2x)
+        by_path = {f['path']: f for f in recently_changed_files}
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as ex:
+            contents = list(ex.map(
+                lambda path: self.get_file_content(owner, repo, path, by_path.get(path, {}).get('last_commit_id'),
+                                                   max_bytes=2 * MAX_FILE_CONTENT),
+                relevant_file_paths
+            ))
+        
         relevant_files = []
-        for file_path in relevant_file_paths:
-            content = self.get_file_content(owner, repo, file_path)
+        for file_path, content in zip(relevant_file_paths, contents):
             if content:
-                # Limit individual file content to prevent token overflow
-                MAX_FILE_CONTENT = 10000  # characters
+                file_info = by_path.get(file_path, {})
                 if len(content) > MAX_FILE_CONTENT:
-                    content = content[:MAX_FILE_CONTENT] + f"\n... (file truncated, original size: {len(content)} characters)"
+                    original_size = file_info.get('size', 0)
+                    size_note = f", original size: {original_size} bytes" if original_size else ""
+                    content = content[:MAX_FILE_CONTENT] + f"\n... (file truncated{size_note})"
                 
-                file_info = next((f for f in recently_changed_files if f['path'] == file_path), {})
                 relevant_files.append({
                     'path': file_path,
                     'name': file_info.get('name', file_path.split('/')[-1]),
@@ -460,60 +909,44 @@ class ErrorAnalyzer:
         print("🔎 Searching for files specifically mentioned in the error message...")
         
         # Extract file names and paths from error message
-        file_patterns = [
-            r'\\([^\\]+\.(?:cs|vb|aspx|ascx|config|json|xml))',  # Windows paths
-            r'/([^/]+\.(?:cs|vb|aspx|ascx|config|json|xml))',   # Unix paths
-            r'([A-Za-z][A-Za-z0-9_]*\.(?:cs|vb|aspx|ascx|config|json|xml))',  # File names
-        ]
-        
-        mentioned_files = set()
-        for pattern in file_patterns:
-            matches = re.findall(pattern, error_message, re.IGNORECASE)
-            mentioned_files.update(matches)
+        mentioned_files = _mentioned_files(error_message)
         
         print(f"📄 Found {len(mentioned_files)} files mentioned in error: {list(mentioned_files)}")
         
-        # Search for these files in the repository
-        found_files = []
+        mentioned_re = _substring_matcher(mentioned_files)
+        if mentioned_re is None:
+            print("✅ Found 0 relevant files mentioned in the error")
+            return []
         
-        def search_for_files(path: str = "", depth: int = 0):
-            MAXDEPTH = 4
-            if depth > MAXDEPTH or len(found_files) >= max_files:
-                return
-            
-            contents = self.get_repo_structure(owner, repo, path)
-            if not contents:
-                return
-            
-            # Handle both list and dict responses
-            if isinstance(contents, dict):
-                contents = [contents]
-            
-            for item in contents:
-                if len(found_files) >= max_files:
-                    break
-                    
-                if item.get('type') == 'file':
-                    file_path = item['path']
-                    file_name = item['name']
-                    
-                    # Check if this file is mentioned in the error
-                    if any(mentioned_file.lower() in file_name.lower() for mentioned_file in mentioned_files):
-                        content = self.get_file_content(owner, repo, file_path)
-                        if content:
-                            found_files.append({
-                                'path': file_path,
-                                'name': file_name,
-                                'content': content[:5000],  # Limit content size
-                                'size': item.get('size', 0),
-                                'matched_pattern': next((f for f in mentioned_files if f.lower() in file_name.lower()), '')
-                            })
-                            
-                elif item.get('type') == 'dir' and depth < MAXDEPTH:
-                    # Recursively search subdirectories
-                    search_for_files(item['path'], depth + 1)
+        # List the whole tree in one call and filter client-side
+        listing = self.get_repo_structure(owner, repo, recursion='Full')
+        if isinstance(listing, dict):
+            listing = [listing] if listing else []
         
-        search_for_files()
+        matched_items = [
+            item for item in listing
+            if item.get('type') == 'file' and mentioned_re.search(item['name'].lower())
+        ]
+        
+        found_files = []
+        # Fetch in bounded batches and stop once max_files have content, so a common name
+        # (e.g. Web.config) in a large repo doesn't fan out into hundreds of requests
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as ex:
+            start = 0
+            while start < len(matched_items) and len(found_files) < max_files:
+                batch = matched_items[start:start + min(MAX_FETCH_WORKERS, max_files - len(found_files))]
+                start += len(batch)
+                file_contents = ex.map(lambda item: self.get_file_content(owner, repo, item['path']), batch)
+                for item, content in zip(batch, file_contents):
+                    if content:
+                        file_name = item['name']
+                        found_files.append({
+                            'path': item['path'],
+                            'name': file_name,
+                            'content': content[:5000],  # Limit content size
+                            'size': item.get('size', 0),
+                            'matched_pattern': next((f for f in mentioned_files if f.lower() in file_name.lower()), '')
+                        })
         
         print(f"✅ Found {len(found_files)} relevant files mentioned in the error")
         return found_files
@@ -536,27 +969,12 @@ class ErrorAnalyzer:
         # Limit files for token efficiency - but don't pre-filter based on patterns
         # Let AI decide relevance based on the actual error message
         selected_files = all_files[:50]  # Just limit total number for token efficiency
-        file_list = "\n".join([f"- {f['path']}" for f in selected_files])
-        
-        ai_prompt = f"""You are a code analysis expert. Analyze this specific error message and select the {max_files} most relevant files from the repository.
-
-ERROR MESSAGE TO ANALYZE:
-{error_message}
-
-AVAILABLE FILES IN REPOSITORY:
-{file_list}
-
-ANALYSIS INSTRUCTIONS:
-1. Look for files whose names contain keywords from the error message
-2. If the error mentions specific classes, methods, or namespaces, find files likely to contain them
-3. Consider the error type (e.g., NullReferenceException, SqlException) and find related files
-4. Look for configuration files if the error seems configuration-related
-5. Include entry points (Program.cs, Startup.cs) only if the error occurs during startup
-
-IMPORTANT: Base your selection ONLY on the specific error message provided, not on generic .NET patterns.
-
-Return ONLY a JSON array of the most relevant file paths:
-["path/to/relevant/file1.cs", "path/to/relevant/file2.cs"]"""
+        # Instructions live in the static system prompt; only the per-call data goes here
+        ai_prompt = orjson.dumps({
+            "max_files": max_files,
+            "error": error_message,
+            "files": [f['path'] for f in selected_files]
+        }).decode('utf-8')
         
         try:
             if OPENAI_KEY and IC_OpenAI_URL:
@@ -565,11 +983,11 @@ Return ONLY a JSON array of the most relevant file paths:
                     'Content-Type': 'application/json'
                 }
                 
-                payload = json.dumps({
+                payload = orjson.dumps({
                     "messages": [
                         {
                             "role": "system",
-                            "content": "You are a code analysis expert that helps identify relevant files for error analysis. Return only a JSON array of file paths without any additional text."
+                            "content": _FILE_SELECTION_SYSTEM_PROMPT
                         },
                         {
                             "role": "user",
@@ -579,14 +997,17 @@ Return ONLY a JSON array of the most relevant file paths:
                     "temperature": 0.1
                 })
                 
-                response = requests.post(
+                response = self._request(
+                    'POST',
                     IC_OpenAI_URL,
+                    slots=self._ai_request_slots,
                     headers=headers,
-                    data=payload
+                    data=payload,
+                    timeout=AI_TIMEOUT
                 )
                 
                 if response.status_code == 200:
-                    response_data = response.json()
+                    response_data = orjson.loads(response.content)
                     ai_response = response_data['choices'][0]['message']['content'].strip()
                     
                     # Try to extract JSON array from response
@@ -596,16 +1017,16 @@ Return ONLY a JSON array of the most relevant file paths:
                             start = ai_response.find('[')
                             end = ai_response.rfind(']') + 1
                             json_str = ai_response[start:end]
-                            selected_paths = json.loads(json_str)
+                            selected_paths = orjson.loads(json_str)
                             
                             # Validate that the paths exist in our file list
-                            available_paths = [f['path'] for f in all_files]
+                            available_paths = {f['path'] for f in all_files}
                             valid_paths = [path for path in selected_paths if path in available_paths]
                             
                             if valid_paths:
                                 return valid_paths[:max_files]
                         
-                    except (json.JSONDecodeError, KeyError):
+                    except (orjson.JSONDecodeError, KeyError):
                         print("Failed to parse AI response as JSON, using fallback")
                 else:
                     print(f"Azure OpenAI API error (select relevant files): {response.status_code} {response.text}")
@@ -626,57 +1047,66 @@ Return ONLY a JSON array of the most relevant file paths:
         error_lower = error_message.lower()
         
         # Extract meaningful keywords from error message (filter out common words)
-        error_keywords = re.findall(r'\b[a-zA-Z_][a-zA-Z0-9_]*\b', error_lower)
+        error_keywords = _KEYWORD_RE.findall(error_lower)
         # Filter out very short words and common words
         common_words = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during', 'before', 'after', 'above', 'below', 'between', 'among', 'against', 'within', 'without', 'throughout', 'error', 'exception', 'null', 'reference'}
         error_keywords = [k for k in error_keywords if len(k) > 3 and k not in common_words]
         
-        for file_info in all_files:
-            file_path = file_info['path'].lower()
-            file_name = file_info['name'].lower()
+        # Look for class/namespace patterns in error message
+        # Extract potential class names (PascalCase words)
+        keyword_set = set(error_keywords)
+        class_set = {c.lower() for c in _CLASS_RE.findall(error_message) if len(c) > 3}
+        
+        # One pass over the path rules out files that contain no keyword or class name
+        # at all (the file name is part of the path), skipping the per-term checks
+        term_re = _substring_matcher(keyword_set | class_set)
+        meta = [(f['path'], f['path'].lower(), f['name'].lower()) for f in all_files]
+        
+        # Error-type hints depend only on the message
+        is_data_error = 'sqlexception' in error_lower or 'database' in error_lower
+        is_config_error = 'configuration' in error_lower or 'config' in error_lower
+        is_startup_error = 'startup' in error_lower or 'program' in error_lower
+        
+        for original_path, file_path, file_name in meta:
             score = 0
             
-            # High score for direct keyword matches in filename
-            for keyword in error_keywords:
-                if keyword in file_name:
-                    score += 20  # High priority for filename matches
-                elif keyword in file_path:
-                    score += 10  # Medium priority for path matches
-            
-            # Look for class/namespace patterns in error message
-            # Extract potential class names (PascalCase words)
-            class_patterns = re.findall(r'\b[A-Z][a-zA-Z0-9]*\b', error_message)
-            for class_name in class_patterns:
-                if len(class_name) > 3:
-                    class_lower = class_name.lower()
+            if term_re is not None and term_re.search(file_path):
+                # High score for direct keyword matches in filename
+                for keyword in keyword_set:
+                    if keyword in file_name:
+                        score += 20  # High priority for filename matches
+                    elif keyword in file_path:
+                        score += 10  # Medium priority for path matches
+                
+                for class_lower in class_set:
                     if class_lower in file_name:
                         score += 15
                     elif class_lower in file_path:
                         score += 8
             
             # Check for specific error types and related files
-            if 'sqlexception' in error_lower or 'database' in error_lower:
+            if is_data_error:
                 if any(pattern in file_path for pattern in ['data', 'repository', 'dbcontext', 'sql']):
                     score += 12
             
-            if 'configuration' in error_lower or 'config' in error_lower:
-                if file_name.endswith(('.config', '.json', '.xml')):
+            if is_config_error:
+                if file_name.endswith(_CONFIG_EXTENSIONS):
                     score += 15
             
-            if 'startup' in error_lower or 'program' in error_lower:
+            if is_startup_error:
                 if any(pattern in file_name for pattern in ['startup', 'program', 'main']):
                     score += 15
             
             # Slight preference for code files over other types, but only if there's already some relevance
-            if score > 0 and file_name.endswith(('.cs', '.vb')):
+            if score > 0 and file_name.endswith(_CODE_EXTENSIONS):
                 score += 2
             
             if score > 0:
-                scored_files.append((file_info['path'], score))
+                scored_files.append((original_path, score))
         
-        # Sort by score and return top files
-        scored_files.sort(key=lambda x: x[1], reverse=True)
-        return [file_path for file_path, _ in scored_files[:max_files]]
+        # Return the top-scoring files without sorting the whole candidate list
+        top_files = heapq.nlargest(max_files, scored_files, key=lambda x: x[1])
+        return [file_path for file_path, _ in top_files]
     
     def analyze_error(self, error_message: str, repo_url: str, progress_callback=None, days: int = 14) -> Dict:
         """
@@ -732,7 +1162,7 @@ Return ONLY a JSON array of the most relevant file paths:
             
             # Debug: Print context size
             context_chars = len(context)
-            estimated_tokens = context_chars // 4
+            estimated_tokens = _count_tokens(context)
             print(f"📊 Context prepared: {context_chars:,} characters (~{estimated_tokens:,} tokens)")
             
             if estimated_tokens > 100000:
@@ -775,57 +1205,79 @@ Return ONLY a JSON array of the most relevant file paths:
         Returns:
             Formatted context string
         """
-        # Estimate tokens (rough approximation: 1 token ≈ 4 characters)
+        # Budget in real tokens, so code-heavy files aren't under-packed by a chars/4 estimate
         MAX_TOKENS = 100000  # Leave room for response and system prompt
-        MAX_CHARS = MAX_TOKENS * 4
+        MAX_FILE_TOKENS = 2000
         
-        context = f"""ERROR MESSAGE:
+        # Collect sections in a list and join once, rather than growing one string
+        parts = [f"""ERROR MESSAGE:
 {error_message}
 
 RELEVANT CODE FILES:
-"""
+"""]
         
-        current_length = len(context)
+        current_tokens = _count_tokens(parts[0])
         files_included = 0
         
-        for file_info in relevant_files:
+        # Identical content (renames, copies) is included once; later copies only point at the first
+        first_path_by_digest = {}
+        duplicate_of = []
+        digests = []
+        for f in relevant_files:
+            digest = hashlib.blake2b(f['content'].encode('utf-8', 'ignore'), digest_size=16).digest()
+            digests.append(digest)
+            duplicate_of.append(first_path_by_digest.get(digest))
+            first_path_by_digest.setdefault(digest, f['path'])
+        
+        # Size every file up front so small files hand their unused share to the large ones,
+        # rather than splitting the remaining budget evenly as the loop goes
+        all_file_tokens = [
+            0 if original else _count_file_tokens(f['content'], digest)
+            for f, original, digest in zip(relevant_files, duplicate_of, digests)
+        ]
+        budgets = _allocate_budgets(
+            all_file_tokens,
+            MAX_TOKENS - current_tokens - SECTION_OVERHEAD_TOKENS * len(relevant_files),
+            MAX_FILE_TOKENS
+        )
+        
+        for file_info, file_tokens, max_file_tokens, original_path in zip(relevant_files, all_file_tokens, budgets, duplicate_of):
             file_content = file_info['content']
             file_path = file_info['path']
             
-            # Truncate individual file content if too large
-            max_file_chars = min(8000, (MAX_CHARS - current_length) // max(1, len(relevant_files) - files_included))
-            
-            if len(file_content) > max_file_chars:
-                # Extract key parts: beginning, any error-related sections, and end
+            if original_path:
+                file_section = _FILE_DUPLICATE_TEMPLATE.format_map({'path': file_path, 'original': original_path})
+                section_tokens = _count_tokens(file_section)
+            elif file_tokens > max_file_tokens:
+                # Extract key parts: beginning, any error-related sections, and end;
+                # the token budget becomes a character budget at this file's own density
+                max_file_chars = int(max_file_tokens * len(file_content) / file_tokens)
                 truncated_content = self._smart_truncate_content(file_content, max_file_chars, error_message)
-                file_section = f"""
-                    --- FILE: {file_path} (TRUNCATED - {len(file_content)} chars total) ---
-                    {truncated_content}
-                    [... content truncated for token limit ...]
-
-                    """
+                file_section = _FILE_TRUNCATED_TEMPLATE.format_map({
+                    'path': file_path,
+                    'total': len(file_content),
+                    'content': truncated_content
+                })
+                section_tokens = _count_tokens(file_section)
             else:
-                file_section = f"""
-                    --- FILE: {file_path} ---
-                    {file_content}
-
-                    """
+                file_header = _FILE_HEADER_TEMPLATE.format_map({'path': file_path})
+                file_section = f"{file_header}{file_content}\n\n"
+                # Reuse the content's token count instead of encoding it again
+                section_tokens = _count_tokens(file_header) + file_tokens + 1
             
             # Check if adding this file would exceed limits
-            if current_length + len(file_section) > MAX_CHARS:
-                context += f"""
-                    --- ADDITIONAL FILES OMITTED DUE TO TOKEN LIMIT ---
-                    {len(relevant_files) - files_included} more files were analyzed but omitted from context to stay within token limits.
-                    Files omitted: {[f['path'] for f in relevant_files[files_included:]]}
-
-                    """
+            if current_tokens + section_tokens > MAX_TOKENS:
+                parts.append(_FILES_OMITTED_TEMPLATE.format_map({
+                    'count': len(relevant_files) - files_included,
+                    'paths': [f['path'] for f in relevant_files[files_included:]]
+                }))
                 break
             
-            context += file_section
-            current_length += len(file_section)
+            parts.append(file_section)
+            current_tokens += section_tokens
             files_included += 1
         
-        return context
+        return ''.join(parts)
     
     def _smart_truncate_content(self, content: str, max_chars: int, error_message: str) -> str:
         """
@@ -842,57 +1294,42 @@ RELEVANT CODE FILES:
         if len(content) <= max_chars:
             return content
         
-        lines = content.split('\n')
-        
         # Extract keywords from error message for relevance scoring
-        error_keywords = re.findall(r'\b[A-Za-z_][A-Za-z0-9_]*\b', error_message.lower())
-        error_keywords = [k for k in error_keywords if len(k) > 3]
-        
-        # Score lines based on relevance
-        scored_lines = []
-        for i, line in enumerate(lines):
-            score = 0
-            line_lower = line.lower()
-            
-            # Higher score for lines containing error keywords
-            for keyword in error_keywords:
-                if keyword in line_lower:
-                    score += 10
-            
-            # Score for important code patterns
-            if any(pattern in line_lower for pattern in ['public', 'private', 'class', 'method', 'function', 'sub ', 'dim ', 'if ', 'try', 'catch', 'throw']):
-                score += 3
-            
-            # Score for configuration and important declarations
-            if any(pattern in line_lower for pattern in ['config', 'connection', 'setting', 'import', 'using', 'namespace']):
-                score += 2
-            
-            scored_lines.append((i, line, score))
-        
-        # Always include the beginning (class/namespace declarations)
+        error_keywords = tuple(sorted({k.lower() for k in _LONG_KEYWORD_RE.findall(error_message)}))
+        
+        # With nothing to look for, or no real line structure (minified/generated files),
+        # line scoring can't pick anything meaningful: keep the head and tail instead
+        if not error_keywords or content.count('\n') < len(content) * 0.005:
+            marker = '\n...[truncated]...\n'
+            head = int(max_chars * 0.7)
+            tail = max(0, max_chars - head - len(marker))
+            return content[:head] + marker + (content[-tail:] if tail else '')
+        
+        # Always include the beginning (class/namespace declarations);
+        # lines past it are scored and only those with some relevance are candidates
+        lines, scored_lines = _scored_lines(content, error_keywords, 20)
         beginning_lines = lines[:min(20, len(lines))]
         
-        # Sort by relevance and take top scoring lines
-        scored_lines.sort(key=lambda x: x[2], reverse=True)
+        # Only as many top lines as can fit are ever used, so select those instead of sorting every line
+        avg_line_len = max(1, len(content) // len(lines))
+        top_lines = heapq.nlargest(max_chars // avg_line_len + 32, scored_lines, key=lambda x: x[2])
         
-        # Take top relevant lines while maintaining some order
-        relevant_lines = []
-        used_chars = len('\n'.join(beginning_lines))
+        # Take top relevant lines while maintaining some order; size is tracked
+        # arithmetically rather than by joining to measure
+        used_chars = sum(map(len, beginning_lines)) + max(0, len(beginning_lines) - 1)
         
         # Add beginning
-        for line in beginning_lines:
-            relevant_lines.append(line)
+        relevant_lines = list(beginning_lines)
         
         # Add most relevant lines if we have space
         remaining_chars = max_chars - used_chars
-        for line_num, line, score in scored_lines:
-            if score > 0 and line_num >= 20:  # Skip lines already included in beginning
-                if len(line) + 1 <= remaining_chars:  # +1 for newline
-                    relevant_lines.append(f"... (line {line_num + 1}) ...")
-                    relevant_lines.append(line)
-                    remaining_chars -= len(line) + 1
-                    if remaining_chars < 100:  # Leave some room
-                        break
+        for line_num, line, score in top_lines:
+            if len(line) + 1 <= remaining_chars:  # +1 for newline
+                relevant_lines.append(f"... (line {line_num + 1}) ...")
+                relevant_lines.append(line)
+                remaining_chars -= len(line) + 1
+                if remaining_chars < 100:  # Leave some room
+                    break
         
         return '\n'.join(relevant_lines)
     
@@ -910,59 +1347,18 @@ RELEVANT CODE FILES:
         try:
             if OPENAI_KEY and IC_OpenAI_URL:
                 # Create a specialized prompt for error analysis
-                analysis_prompt = f"""You are an expert .NET developer and error analysis specialist. Analyze the following error message and related code files to provide a comprehensive root cause analysis.
-
-{context}
-
-Please provide a detailed analysis following this structure:
-
-# Root Cause Analysis
-
-## Error Summary
-Provide a clear, concise summary of what the error means and where it occurs.
-
-## Root Cause Identification
-1. **Primary Cause**: Identify the most likely root cause based on the error message and code
-2. **Contributing Factors**: List any secondary issues that may have contributed
-3. **Code Location**: Pinpoint the exact location and line where the problem occurs
-
-## Code Analysis
-- Analyze the specific code patterns that led to this error
-- Identify any anti-patterns or problematic implementations
-- Review variable initialization, null checks, and object lifecycle
-
-## Immediate Fixes
-Provide specific, actionable code changes to fix this error:
-```csharp
-// Example fix with actual code snippets
-```
-
-## Prevention Strategies
-- Suggest coding practices to prevent similar errors
-- Recommend additional validation or error handling
-- Identify areas for refactoring or improvement
-
-## Testing Recommendations
-- Suggest specific test cases to verify the fix
-- Recommend integration tests or scenarios to prevent regression
-
-## Additional Considerations
-- Performance implications of the fix
-- Security considerations if applicable
-- Compatibility with existing code
-
-Focus on practical, implementable solutions specific to this error and codebase."""
+                analysis_prompt = _ANALYSIS_PROMPT_TEMPLATE.format(context=context)
 
                 headers = {
                     'api-key': OPENAI_KEY,
                     'Content-Type': 'application/json'
                 }
                 
-                payload = json.dumps({
+                payload = orjson.dumps({
                     "messages": [
                         {
                             "role": "system",
-                            "content": "You are an expert .NET developer and error analysis specialist. Provide detailed, actionable root cause analysis for software errors. Focus on practical solutions and specific code fixes."
+                            "content": _ANALYSIS_SYSTEM_PROMPT
                         },
                         {
                             "role": "user",
@@ -972,14 +1368,17 @@ Focus on practical, implementable solutions specific to this error and codebase.
                     "temperature": 0.2
                 })
                 
-                response = requests.post(
+                response = self._request(
+                    'POST',
                     IC_OpenAI_URL,
+                    slots=self._ai_request_slots,
                     headers=headers,
-                    data=payload
+                    data=payload,
+                    timeout=AI_TIMEOUT
                 )
                 
                 if response.status_code == 200:
-                    response_data = response.json()
+                    response_data = orjson.loads(response.content)
                     ai_analysis = response_data['choices'][0]['message']['content'].strip()
                     
                     # Add metadata about the analysis
@@ -1108,10 +1507,8 @@ var result = myObject?.SomeProperty?.SomeMethod();
         return analysis
     
 
-if __name__ == "__main__":
-    # Example usage with recent changes focus
-    analyzer = ErrorAnalyzer()
-    error_msg = r'''System.Web.HttpUnhandledException: Exception of type 'System.Web.HttpUnhandledException' was thrown. ---> System.NullReferenceException: Object reference not set to an instance of an object.
+# Sample WebForms stack trace, used by the example run below and the tests
+SAMPLE_ERROR_MESSAGE = r'''System.Web.HttpUnhandledException: Exception of type 'System.Web.HttpUnhandledException' was thrown. ---> System.NullReferenceException: Object reference not set to an instance of an object.
 	   at BillerPortal.Dialogs_RemoveLogin.ConfigureDefaultDialogBox() in C:\agent\_work\42\s\BillerPortal\Dialogs\RemoveLogin.aspx.vb:line 318
 	   at BillerPortal.Dialogs_RemoveLogin.Page_Load(Object sender, EventArgs e) in C:\agent\_work\42\s\BillerPortal\Dialogs\RemoveLogin.aspx.vb:line 146
 	   at System.Web.UI.Control.OnLoad(EventArgs e)
@@ -1126,6 +1523,12 @@ if __name__ == "__main__":
 	   at System.Web.HttpApplication.CallHandlerExecutionStep.System.Web.HttpApplication.IExecutionStep.Execute()
 	   at System.Web.HttpApplication.ExecuteStepImpl(IExecutionStep step)
 	   at System.Web.HttpApplication.ExecuteStep(IExecutionStep step, Boolean& completedSynchronously)'''
+
+
+if __name__ == "__main__":
+    # Example usage with recent changes focus
+    analyzer = ErrorAnalyzer()
+    error_msg = SAMPLE_ERROR_MESSAGE
     repo_url = "https://dev.azure.com/invoicecloud/Src/_git/MyIIS"
     
     def simple_progress(message):
@@ -6,6 +6,31 @@ from azure.keyvault.secrets import SecretClient
 from azure.identity import DefaultAzureCredential, ChainedTokenCredential, AzureCliCredential, VisualStudioCodeCredential
 from typing import Optional
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_SECRET_FETCH_WORKERS = 8
+
+SECRET_CACHE_TTL = 10 * 60  # seconds a fetched secret is reused before asking Key Vault again
+
+# Shared across clients: building the credential chain and SecretClient is slow, and
+# DefaultAzureCredential probes the environment and CLI on first use
+_credential = None
+_clients = {}
+_secret_cache = {}  # (vault_url, secret_name) -> (expires_at, value)
+
+
+def _get_credential() -> ChainedTokenCredential:
+    """Return the process-wide credential chain, creating it on first use."""
+    global _credential
+    if _credential is None:
+        # Create a chained credential that tries VS Code first, then falls back to other methods
+        _credential = ChainedTokenCredential(
+            VisualStudioCodeCredential(),  # VS Code credentials (preferred)
+            AzureCliCredential(),          # Azure CLI credentials (fallback)
+            DefaultAzureCredential()       # Default credential chain (final fallback)
+        )
+    return _credential
 
 
 class AzureKeyVaultClient:
@@ -28,16 +53,14 @@ class AzureKeyVaultClient:
         """
         Setup Azure credentials with priority for VS Code authentication.
         """
+        self.client = _clients.get(self.key_vault_url)
+        if self.client is not None:
+            return
+        
         try:
-            # Create a chained credential that tries VS Code first, then falls back to other methods
-            credential_chain = ChainedTokenCredential(
-                VisualStudioCodeCredential(),  # VS Code credentials (preferred)
-                AzureCliCredential(),          # Azure CLI credentials (fallback)
-                DefaultAzureCredential()       # Default credential chain (final fallback)
-            )
-            
             # Create the Key Vault client
-            self.client = SecretClient(vault_url=self.key_vault_url, credential=credential_chain)
+            self.client = SecretClient(vault_url=self.key_vault_url, credential=_get_credential())
+            _clients[self.key_vault_url] = self.client
             print(f"✅ Successfully connected to Key Vault: {self.key_vault_url}")
             
         except Exception as e:
@@ -58,9 +81,15 @@ class AzureKeyVaultClient:
             print("❌ Key Vault client not initialized")
             return None
         
+        cache_key = (self.key_vault_url, secret_name)
+        cached = _secret_cache.get(cache_key)
+        if cached is not None and cached[0] > time.time():
+            return cached[1]
+        
         try:
             secret = self.client.get_secret(secret_name)
             print(f"✅ Successfully retrieved secret: {secret_name}")
+            _secret_cache[cache_key] = (time.time() + SECRET_CACHE_TTL, secret.value)
             return secret.value
         except Exception as e:
             print(f"❌ Failed to retrieve secret '{secret_name}': {e}")
@@ -83,6 +112,7 @@ class AzureKeyVaultClient:
         
         try:
             self.client.set_secret(secret_name, secret_value)
+            _secret_cache[(self.key_vault_url, secret_name)] = (time.time() + SECRET_CACHE_TTL, secret_value)
             print(f"✅ Successfully set secret: {secret_name}")
             return True
         except Exception as e:
@@ -126,8 +156,11 @@ def load_config_from_keyvault(key_vault_url: str, secret_mappings: dict) -> dict
     kv_client = AzureKeyVaultClient(key_vault_url)
     config = {}
     
-    for config_key, secret_name in secret_mappings.items():
-        secret_value = kv_client.get_secret(secret_name)
+    # Each secret is its own round trip, so fetch them concurrently with the shared client
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_SECRET_FETCH_WORKERS, len(secret_mappings)))) as executor:
+        secret_values = list(executor.map(kv_client.get_secret, secret_mappings.values()))
+    
+    for config_key, secret_value in zip(secret_mappings, secret_values):
         if secret_value:
             config[config_key] = secret_value
         else:
@@ -1,6 +1,7 @@
 
 from dotenv import load_dotenv
 import os
+from functools import lru_cache
 from azure.identity import DefaultAzureCredential
 from azure.keyvault.secrets import SecretClient
 
@@ -26,7 +27,14 @@ IC_Embeddings_Model = "text-embedding-ada-002"
 # using Azure keyvault to get secrete
 vault_url = "https://arch-kv-poc.vault.azure.net/" #"https://kv-glb-vault1-dev.vault.azure.net/"
 secret_name = "text-embedding-ada-002-key" #"Playground-OpenAi-ApiKey"
-client = AzureKeyVaultClient(vault_url) 
 
-secret = client.get_secret(secret_name)  
-#print("Secret value:", secret)
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_keyvault_client():
+    """Create the Key Vault client on first use instead of at import."""
+    return AzureKeyVaultClient(vault_url)
+
+
+def get_embedding_api_key():
+    """Embeddings key from the environment, or from Key Vault on first use."""
+    return IC_Embeddings_APIKEY or get_keyvault_client().get_secret(secret_name)
@@ -0,0 +1,2 @@
+# Root conftest: pytest puts this directory on sys.path, so tests import agents/, features/
+# and config the same way the app does when run from the repo root.
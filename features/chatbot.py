@@ -1,20 +1,36 @@
 import gradio as gr
 import os
+import json
 import time
 import math
+import functools
+import collections
+import hashlib
+import sqlite3
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
 from langchain_chroma import Chroma
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 from langchain.chains import ConversationalRetrievalChain
 from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
 from tiktoken import get_encoding
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
-from config import OPENAI_KEY, File_Dir,IC_OpenAI_URL, IC_Embeddings_APIKEY, IC_Embeddings_URL, IC_Embeddings_Model
+from config import OPENAI_KEY, File_Dir,IC_OpenAI_URL, IC_Embeddings_URL, IC_Embeddings_Model, get_embedding_api_key
 from system_prompt import chatbot_instruction
 
 enc = get_encoding("cl100k_base")
 db_name = ".chroma"
+embeddings_cache_name = ".embeddings_cache.sqlite"  # (content hash, model) -> fp16 vector, survives rebuilds
+chunk_cache_name = ".chunk_cache.json"  # file name -> stat stamp and chunk texts, kept outside db_name
+memory_window = 6  # exchanges kept in chat memory
+max_chat_sessions = 64  # per-session chains kept in memory, least recently used dropped first
+retrieval_k = 8  # chunks passed to the chat model per question
+retrieval_fetch_k = 64  # similarity candidates MMR chooses from
+verbose = bool(os.getenv("CHATBOT_VERBOSE"))
 
 class Knowledge:
     def __init__(self):
@@ -35,71 +51,147 @@ class Knowledge:
         chunks = self.chunk_text(text)
         safe = []
         for chunk in chunks:
-            tokens = len(enc.encode(chunk))
-            if tokens > max_tokens:
-                # split further instead of keeping giant chunk
-                mid = len(chunk) // 2
-                safe.extend([chunk[:mid], chunk[mid:]])
+            ids = enc.encode_ordinary(chunk)
+            if len(ids) > max_tokens:
+                # split further instead of keeping giant chunk; slicing token ids
+                # guarantees every piece fits, unlike halving by characters
+                token_bytes = [enc.decode_single_token_bytes(t) for t in ids]
+                start = 0
+                while start < len(ids):
+                    end = min(start + max_tokens, len(ids))
+                    # a token can end inside a multibyte character; back off until the
+                    # next piece starts on a character boundary so neither half is mangled
+                    while end < len(ids) and end > start + 1 and token_bytes[end][0] & 0xC0 == 0x80:
+                        end -= 1
+                    safe.append(b"".join(token_bytes[start:end]).decode("utf-8", errors="replace"))
+                    start = end
             else:
                 safe.append(chunk)
         return safe
 
+    def load_chunk_cache(self):
+        """Load the chunk cache from the previous ingest."""
+        try:
+            with open(chunk_cache_name, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_chunk_cache(self, cache):
+        """Persist the chunk cache for the next ingest."""
+        with open(chunk_cache_name, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+
+    def _read_and_chunk(self, entry, cache):
+        """Chunk one text file, reusing the cached chunks if it is unchanged."""
+        st = entry.stat()
+        stamp = [st.st_mtime_ns, st.st_size]
+        cached = cache.get(entry.name)
+        if cached and cached.get("stamp") == stamp:
+            chunks = cached["chunks"]
+        else:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                text = f.read()
+            chunks = self.safe_chunks(text)
+        return entry.name, stamp, chunks
+
     def process_confluence_data(self):
         """Read text files from directory and chunk them."""
         folder_path = File_Dir
         all_chunks = []
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            if os.path.isfile(file_path): 
-                with open(file_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                    chunks = self.safe_chunks(text)
-                    for chunk in chunks:
-                        all_chunks.append(Document(
-                            page_content=chunk,
-                            metadata={"title": filename}
-                        ))
+        cache = self.load_chunk_cache()
+        new_cache = {}
+        # scandir already knows the entry type; skip hidden in-progress temp files from the writer
+        with os.scandir(folder_path) as it:
+            entries = [e for e in it if e.is_file() and not e.name.startswith(".")]
+        # overlap the file reads; map keeps the directory order
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            for name, stamp, chunks in executor.map(lambda e: self._read_and_chunk(e, cache), entries):
+                new_cache[name] = {"stamp": stamp, "chunks": chunks}
+                all_chunks.extend(Document(page_content=chunk, metadata={"title": name})
+                                  for chunk in chunks)
+        # rebuilt from this scan, so deleted files drop out of the cache
+        self.save_chunk_cache(new_cache)
         print(f"Total chunks created: {len(all_chunks)}")
         return all_chunks
     
     def get_embeddings_using_Azure(self, chunks, update_knowledge_base = False):
         """Get or create embeddings using Azure OpenAI."""
-        emb = AzureOpenAIEmbeddings(
-                model = IC_Embeddings_Model,
-                azure_endpoint = IC_Embeddings_URL,
-                api_key = IC_Embeddings_APIKEY,
-                openai_api_version="2024-02-01"
-            )
+        emb = _get_embeddings_client()
         if os.path.exists(db_name) and not update_knowledge_base:
             # load existing vectorstore
             vectorstore = Chroma(persist_directory=db_name, embedding_function=emb)
-            print(f"Loaded vectorstore with {vectorstore._collection.count()} documents")
+            if verbose:
+                # counting hits the Chroma backend, so only do it when asked
+                print(f"Loaded vectorstore with {vectorstore._collection.count()} documents")
+            else:
+                print(f"Loaded vectorstore from {db_name}")
             return vectorstore
         else:
-            # create new vectorstore with rate limiting
-            vectorstore = self._create_vectorstore_with_rate_limiting(chunks, emb)
+            # create new vectorstore with rate limiting; unchanged chunks reuse their cached vectors
+            vectorstore = self._create_vectorstore_with_rate_limiting(chunks, CachedEmbeddings(emb))
+            # chat turns should pick up the rebuilt store; cached chains hold retrievers on the old one
+            _get_chat_vectorstore.cache_clear()
+            with _session_chains_lock:
+                _session_chains.clear()
         return vectorstore
 
     def _create_vectorstore_with_rate_limiting(self, chunks, embedding_function):
         """Create vectorstore with rate limiting to avoid exceeding API limits."""
-        BATCH_SIZE = 100  # Process 100 documents at a time
+        MAX_BATCH_SIZE = 500  # documents per embeddings request, at most
         MAX_TOKENS_PER_MINUTE = 90000  # Leave some buffer from 100k limit
-        DELAY_BETWEEN_BATCHES = 1  # seconds
+        MAX_TOKENS_PER_BATCH = MAX_TOKENS_PER_MINUTE // 6  # several batches fit in each minute
         
-        print(f"Processing {len(chunks)} chunks in batches of {BATCH_SIZE}", flush=True)
+        texts = [chunk.page_content for chunk in chunks]
+        missing = [True] * len(texts)
+        if isinstance(embedding_function, CachedEmbeddings):
+            # cached chunks cost no API tokens, so they are neither tokenized nor counted against the rate limit
+            missing = embedding_function.missing(texts)
+            print(f"{len(chunks) - sum(missing)} of {len(chunks)} chunks already embedded", flush=True)
         
-        # Calculate total tokens to estimate processing time
-        total_tokens = sum(len(enc.encode(chunk.page_content)) for chunk in chunks)
+        # Calculate total tokens to estimate processing time; counted once and reused per batch
+        # (batched in tiktoken's native thread pool; ordinary encoding skips special-token checks)
+        counts = iter([len(ids) for ids in enc.encode_ordinary_batch(
+            [text for text, miss in zip(texts, missing) if miss], num_threads=os.cpu_count() or 4)])
+        token_counts = [next(counts) if miss else 0 for miss in missing]
+        total_tokens = sum(token_counts)
         estimated_minutes = math.ceil(total_tokens / MAX_TOKENS_PER_MINUTE)
         print(f"Estimated processing time: {estimated_minutes} minutes for {total_tokens} tokens", flush=True)
         
+        # Size batches by tokens rather than a fixed document count
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, tokens in enumerate(token_counts):
+            if i > start and (batch_tokens + tokens > MAX_TOKENS_PER_BATCH or i - start >= MAX_BATCH_SIZE):
+                batches.append((start, i, batch_tokens))
+                start, batch_tokens = i, 0
+            batch_tokens += tokens
+        if start < len(chunks):
+            batches.append((start, len(chunks), batch_tokens))
+        
+        print(f"Processing {len(chunks)} chunks in {len(batches)} token-sized batches", flush=True)
+        
         vectorstore = None
+        added = 0
+        sent = collections.deque()  # (time, tokens) sent within the last minute
         
-        for i in range(0, len(chunks), BATCH_SIZE):
-            batch = chunks[i:i + BATCH_SIZE]
-            batch_tokens = sum(len(enc.encode(chunk.page_content)) for chunk in batch)
+        for n, (first, last, batch_tokens) in enumerate(batches, 1):
+            batch = chunks[first:last]
             
-            print(f"Processing batch {i//BATCH_SIZE + 1}/{math.ceil(len(chunks)/BATCH_SIZE)} "
+            # Only wait when the next batch would go over the per-minute token budget
+            now = time.time()
+            while sent and now - sent[0][0] >= 60:
+                sent.popleft()
+            window_tokens = sum(tokens for _, tokens in sent)
+            while sent and window_tokens + batch_tokens > MAX_TOKENS_PER_MINUTE:
+                wait = 60 - (now - sent[0][0])
+                if wait > 0:
+                    time.sleep(wait)
+                now = time.time()
+                window_tokens -= sent.popleft()[1]
+            
+            print(f"Processing batch {n}/{len(batches)} "
                   f"({len(batch)} docs, {batch_tokens} tokens)", flush=True)
             
             try:
@@ -117,16 +209,12 @@ class Knowledge:
                     print("Adding batch to existing vectorstore...", flush=True)
                     vectorstore.add_documents(batch)
                     # print("Batch added successfully", flush=True)
-                
-                # Add delay to respect rate limits
-                if i + BATCH_SIZE < len(chunks):  # Don't delay after last batch
-                    # print(f"Waiting {DELAY_BETWEEN_BATCHES} seconds before next batch...", flush=True)
-                    time.sleep(DELAY_BETWEEN_BATCHES)
                     
             except Exception as e:
                 if "rate limit" in str(e).lower():
                     print(f"Rate limit hit. Waiting 60 seconds...", flush=True)
                     time.sleep(60)
+                    sent.clear()
                     print("Retrying after rate limit wait...", flush=True)
                     # Retry the batch
                     if vectorstore is None:
@@ -141,25 +229,33 @@ class Knowledge:
                 else:
                     print(f"Error processing batch: {e}", flush=True)
                     raise
+            
+            sent.append((time.time(), batch_tokens))
+            added += len(batch)
         
-        print(f"Vectorstore created with {vectorstore._collection.count()} documents", flush=True)
+        print(f"Vectorstore created with {added} documents added", flush=True)
         return vectorstore
 
-    def create_qa_chain(self):
-        """Create a conversational retrieval chain."""
-        # create a new Chat 
-        llm = AzureChatOpenAI(azure_deployment="cd-pri-playground2-dev",
-                              azure_endpoint= IC_OpenAI_URL,
-                              api_key=OPENAI_KEY,
-                              api_version="2025-01-01-preview",
-                               temperature=0.7)
+    def create_qa_chain(self, history=None):
+        """Create a conversational retrieval chain, seeding its memory from a messages-style history."""
+        # the chat model and vectorstore are shared across turns; only the memory is per chain
+        llm = _get_chat_llm()
      
         # set up the conversation memory for the chat
-        memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
-        chunks = []
-        vectorstore = self.get_embeddings_using_Azure(chunks)
-        # k is how many chunks to use, can be adjusted based on needs
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 200})
+        # bounded to the last few exchanges so prompts don't grow with session length
+        memory = ConversationBufferWindowMemory(memory_key='chat_history', return_messages=True, k=memory_window)
+        for role, content in _text_messages(history)[-2 * memory_window:]:
+            if role == "user":
+                memory.chat_memory.add_user_message(content)
+            else:
+                memory.chat_memory.add_ai_message(content)
+        vectorstore = _get_chat_vectorstore()
+        # k is how many chunks to use, can be adjusted based on needs; MMR picks k diverse
+        # chunks out of the fetch_k most similar so the prompt carries less near-duplicate text
+        retriever = vectorstore.as_retriever(
+            search_type="mmr",
+            search_kwargs={"k": retrieval_k, "fetch_k": retrieval_fetch_k, "lambda_mult": 0.5}
+        )
 
         qa_prompt = PromptTemplate(
             input_variables=["context", "question"],
@@ -170,10 +266,131 @@ class Knowledge:
         
         return conversation_chain
 
-def chat_with_knowledge_base(question, history):
-    """Chat with the knowledge base using the conversation chain."""
-    knowledge = Knowledge()
-    conversation_chain = knowledge.create_qa_chain()
+def _pack_f16(vector):
+    """Store a vector as half floats, about 3 significant digits, enough for cosine ranking."""
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+def _unpack_f16(blob):
+    """Widen a stored half-float vector back to Python floats."""
+    return list(struct.unpack(f"<{len(blob) // 2}e", blob))
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that stores document vectors on disk keyed by content and model."""
+
+    LOOKUP_BATCH = 500  # keys per query, under SQLite's bound-parameter limit
+
+    def __init__(self, embeddings, path=embeddings_cache_name, model=IC_Embeddings_Model):
+        self.embeddings = embeddings
+        self.path = path
+        self.model = model
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings_f16 "
+                         "(hash TEXT, model TEXT, vector BLOB, PRIMARY KEY (hash, model))")
+
+    def _key(self, text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, conn, keys):
+        """Fetch cached vectors for keys with one query per LOOKUP_BATCH keys."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), self.LOOKUP_BATCH):
+            part = unique[i:i + self.LOOKUP_BATCH]
+            rows = conn.execute(
+                f"SELECT hash, vector FROM embeddings_f16 WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                [self.model, *part])
+            for key, blob in rows:
+                found[key] = blob
+        return found
+
+    def missing(self, texts):
+        """Flag which texts have no cached vector yet."""
+        keys = [self._key(text) for text in texts]
+        with sqlite3.connect(self.path) as conn:
+            found = self._lookup(conn, keys)
+        return [key not in found for key in keys]
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        with sqlite3.connect(self.path) as conn:
+            # every vector is returned as its stored fp16 rounding, so warm and cold rebuilds index the same values
+            found = {key: _unpack_f16(blob) for key, blob in self._lookup(conn, keys).items()}
+            # first index of each uncached text, so repeats in one batch are embedded once
+            todo = {}
+            for i, key in enumerate(keys):
+                if key not in found:
+                    todo.setdefault(key, i)
+            if todo:
+                # only chunks not seen before go to the API, in one batched call
+                vectors = self.embeddings.embed_documents([texts[i] for i in todo.values()])
+                rows = []
+                for key, vector in zip(todo, vectors):
+                    blob = _pack_f16(vector)
+                    found[key] = _unpack_f16(blob)
+                    rows.append((key, self.model, blob))
+                conn.executemany("INSERT OR REPLACE INTO embeddings_f16 VALUES (?, ?, ?)", rows)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+@functools.lru_cache(maxsize=1)
+def _get_embeddings_client():
+    """Create the embeddings client once so its connection pool is reused."""
+    return AzureOpenAIEmbeddings(
+            model = IC_Embeddings_Model,
+            azure_endpoint = IC_Embeddings_URL,
+            api_key = get_embedding_api_key(),
+            openai_api_version="2024-02-01"
+        )
+
+@functools.lru_cache(maxsize=1)
+def _get_chat_llm():
+    """Create the chat model once; it holds its own HTTP client."""
+    return AzureChatOpenAI(azure_deployment="cd-pri-playground2-dev",
+                           azure_endpoint= IC_OpenAI_URL,
+                           api_key=OPENAI_KEY,
+                           api_version="2025-01-01-preview",
+                           temperature=0.7)
+
+@functools.lru_cache(maxsize=1)
+def _get_chat_vectorstore():
+    """Open the persisted vectorstore once instead of on every chat turn."""
+    return Knowledge().get_embeddings_using_Azure([])
+
+_session_chains = collections.OrderedDict()  # session hash -> conversation chain
+_session_chains_lock = threading.Lock()
+
+def _text_messages(history):
+    """(role, content) pairs of the user/assistant text messages in a messages-style history."""
+    return [
+        (message.get("role"), message.get("content"))
+        for message in history or []
+        # skip file and component messages
+        if message.get("role") in ("user", "assistant") and isinstance(message.get("content"), str)
+    ]
+
+def _get_session_chain(session_hash, history):
+    """Return the chain for a browser session, creating it from history the first time it is seen."""
+    if session_hash is None:
+        return Knowledge().create_qa_chain(history)
+    with _session_chains_lock:
+        chain = _session_chains.get(session_hash)
+        # a chain remembering more than the chat shows was cleared, retried or undone in the UI
+        if chain is not None and len(chain.memory.chat_memory.messages) <= len(_text_messages(history)):
+            _session_chains.move_to_end(session_hash)
+            return chain
+    chain = Knowledge().create_qa_chain(history)
+    with _session_chains_lock:
+        _session_chains[session_hash] = chain
+        _session_chains.move_to_end(session_hash)
+        while len(_session_chains) > max_chat_sessions:
+            _session_chains.popitem(last=False)
+    return chain
+
+def chat_with_knowledge_base(question, history, request: gr.Request = None):
+    """Chat with the knowledge base using the session's conversation chain."""
+    conversation_chain = _get_session_chain(getattr(request, "session_hash", None), history)
     result = conversation_chain.invoke({"question": question})
     return result["answer"]
 
@@ -1,10 +1,74 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
-from typing import Dict, List, Optional
+from functools import cached_property, lru_cache
+from itertools import islice
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
 from agents.error_analyzer import ErrorAnalyzer
 from config import OPENAI_KEY, IC_OpenAI_URL
 
+_AZDO_HOSTS = ("dev.azure.com", "visualstudio.com")
+
+# One connection pool for every analyzer the feature creates, so Azure DevOps and OpenAI
+# connections outlive a single analyzer instance
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# read-only: the UI only iterates these
+_SAMPLE_REPOS = (
+    MappingProxyType({
+        "name": "Biller Search API",
+        "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerSearchAPI",
+        "description": "Quick Find"
+    }),
+    MappingProxyType({
+        "name": "MyIIS",
+        "url": "https://dev.azure.com/invoicecloud/Src/_git/MyIIS",
+        "description": "Shared repo"
+    }),
+    MappingProxyType({
+        "name": "Biller Reporting Chat API",
+        "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerReportingChatAPI",
+        "description": "AI reporting"
+    }),
+    MappingProxyType({
+        "name": "Biller Reporting API",
+        "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerReportingAPI",
+        "description": "GraphQL schema and resolvers"
+    }),
+)
+
+_SAMPLE_ERRORS = (
+    # .NET specific errors with stack traces
+    """System.NullReferenceException: Object reference not set to an instance of an object.""",
+    
+    """System.ArgumentNullException: Value cannot be null.""",
+    
+    """System.Data.SqlClient.SqlException: A network-related or instance-specific error occurred while establishing a connection to SQL Server.""",
+
+    # Configuration and deployment errors
+    "System.IO.FileNotFoundException: Could not load file or assembly 'Newtonsoft.Json, Version=13.0.0.0' or one of its dependencies.",
+    
+    "System.Security.SecurityException: Request for the permission of type 'System.Security.Permissions.FileIOPermission' failed.",
+    
+    # Web-specific errors
+    "System.Web.UI.ViewStateException: Invalid viewstate. Client IP: 192.168.1.100 User-Agent: Mozilla/5.0",
+    
+    "System.Web.Services.Protocols.SoapException: Server was unable to process request. ---> System.ArgumentException: Invalid billing account number.",
+    
+    # Modern .NET Core errors
+    "Microsoft.AspNetCore.Http.BadHttpRequestException: Reading the request body timed out due to data arriving too slowly.",
+    
+    "System.Text.Json.JsonException: The JSON value could not be converted to System.DateTime."
+)
+
 
 class ErrorAnalysisFeature:
     """
@@ -12,23 +76,18 @@ class ErrorAnalysisFeature:
     Integrates with ErrorAnalyzer agent and Azure OpenAI services.
     """
     
-    def __init__(self):
-        self.analyzer = ErrorAnalyzer()
-        self.setup_ai_client()
-    
-    def setup_ai_client(self):
-        """Setup Azure OpenAI client for analysis."""
-        try:
-            # Check if Azure OpenAI credentials are available
-            if OPENAI_KEY and IC_OpenAI_URL:
-                self.ai_available = True
-                print("✅ Azure OpenAI client configured successfully")
-            else:
-                self.ai_available = False
-                print("⚠️ Azure OpenAI credentials not configured")
-        except Exception as e:
-            print(f"❌ AI client setup failed: {e}")
-            self.ai_available = False
+    @cached_property
+    def analyzer(self) -> ErrorAnalyzer:
+        """Repository analyzer, built on first use."""
+        return ErrorAnalyzer(session=_HTTP)
+
+    @cached_property
+    def ai_available(self) -> bool:
+        """Whether Azure OpenAI credentials are configured, checked on first use."""
+        available = bool(OPENAI_KEY and IC_OpenAI_URL)
+        if not available:
+            print("⚠️ Azure OpenAI credentials not configured")
+        return available
     
     def validate_inputs(self, error_message: str, repo_url: str) -> Optional[str]:
         """
@@ -47,7 +106,8 @@ class ErrorAnalysisFeature:
         if not repo_url.strip():
             return "Please provide a repository URL."
         
-        if not ('dev.azure.com' in repo_url.lower() or 'visualstudio.com' in repo_url.lower()):
+        repo_url_lower = repo_url.lower()
+        if not any(host in repo_url_lower for host in _AZDO_HOSTS):
             return "Currently only Azure DevOps repositories are supported."
         
         return None
@@ -73,11 +133,15 @@ class ErrorAnalysisFeature:
                 yield f"❌ Validation Error: {validation_error}"
                 return
             
-            yield "🚀 Starting error analysis with recent changes focus...\n\n"
-            yield f"🔍 Analyzing files changed in the past {days} days\n\n"
-            
-            # Step 1: Repository Analysis with Recent Changes Focus
-            yield "📂 Analyzing repository structure and extracting relevant files from recent commits...\n\n"
+            # Buffer each section and flush it as one update at the section boundary
+            buf = [
+                "🚀 Starting error analysis with recent changes focus...\n\n",
+                f"🔍 Analyzing files changed in the past {days} days\n\n",
+                # Step 1: Repository Analysis with Recent Changes Focus
+                "📂 Analyzing repository structure and extracting relevant files from recent commits...\n\n",
+            ]
+            yield "".join(buf)
+            buf.clear()
             
             def update_progress(message):
                 yield f"   {message}\n\n"
@@ -89,109 +153,76 @@ class ErrorAnalysisFeature:
                 yield f"❌ Repository Analysis Failed: {result['error']}\n\n"
                 return
             
-            yield f"✅ Repository Analysis Complete!\n\n"
-            yield f"   📋 Analyzed repository: {result['repo_info']}\n\n"
-            yield f"   📅 Analysis scope: {result.get('analysis_scope', 'Recent changes')}\n\n"
-            yield f"   📁 Files examined: {len(result['files_analyzed'])}\n\n"
+            files_analyzed = result['files_analyzed']
+            analysis_scope = result.get('analysis_scope', 'Recent changes')
+            append = buf.append
+            append("✅ Repository Analysis Complete!\n\n")
+            append(f"   📋 Analyzed repository: {result['repo_info']}\n\n")
+            append(f"   📅 Analysis scope: {analysis_scope}\n\n")
+            append(f"   📁 Files examined: {len(files_analyzed)}\n\n")
             
             # Show commit information for analyzed files
             commit_info = result.get('commit_info', [])
             if commit_info:
-                yield "   📝 Recent commit information:\n\n"
-                for info in commit_info[:3]:  # Show first 3 commits
-                    yield f"      • {info['path']} (Commit: {info['last_commit_id'][:8]})\n\n"
-                    yield f"        └─ {info['last_commit_message'][:60]}...\n\n"
+                append("   📝 Recent commit information:\n\n")
+                buf.extend(  # Show first 3 commits
+                    f"      • {info['path']} (Commit: {info['last_commit_id'][:8]})\n\n"
+                    f"        └─ {info['last_commit_message'][:60]}...\n\n"
+                    for info in islice(commit_info, 3)
+                )
                 if len(commit_info) > 3:
-                    yield f"      ... and {len(commit_info) - 3} more recent changes\n\n"
+                    append(f"      ... and {len(commit_info) - 3} more recent changes\n\n")
             
             # List analyzed files
-            yield "   📄 Relevant files found:\n\n"
-            for file_path in result['files_analyzed'][:5]:  # Show first 5 files
-                yield f"      • {file_path}\n\n"
-            if len(result['files_analyzed']) > 5:
-                yield f"      ... and {len(result['files_analyzed']) - 5} more files\n\n"
+            append("   📄 Relevant files found:\n\n")
+            buf.extend(f"      • {file_path}\n\n" for file_path in islice(files_analyzed, 5))  # Show first 5 files
+            if len(files_analyzed) > 5:
+                append(f"      ... and {len(files_analyzed) - 5} more files\n\n")
+            yield "".join(buf)
+            buf.clear()
             
             # Step 2: AI Analysis
-            yield "\n\n🤖 Performing AI-powered root cause analysis...\n\n"
+            append("\n\n🤖 Performing AI-powered root cause analysis...\n\n")
             
             # The error analyzer now handles AI analysis internally
-            yield f"✅ AI Analysis Complete!\n\n"
-            yield f"📊 **Root Cause Analysis Results:**\n\n"
-            yield result['analysis']
+            append("✅ AI Analysis Complete!\n\n")
+            append("📊 **Root Cause Analysis Results:**\n\n")
+            append(result['analysis'])
             
             # Add summary of analysis scope
-            yield f"\n\n---\n\n"
-            yield f"**Analysis Summary:**\n\n"
-            yield f"- Repository: {result['repo_info']}\n\n"
-            yield f"- Scope: {result.get('analysis_scope', 'Recent changes')}\n\n"
-            yield f"- Files analyzed: {len(result['files_analyzed'])}\n\n"
-            yield f"- AI-powered: {'✅' if self.ai_available else '❌'}\n\n"
+            append("\n\n---\n\n")
+            append("**Analysis Summary:**\n\n")
+            append(f"- Repository: {result['repo_info']}\n\n")
+            append(f"- Scope: {analysis_scope}\n\n")
+            append(f"- Files analyzed: {len(files_analyzed)}\n\n")
+            append(f"- AI-powered: {'✅' if self.ai_available else '❌'}\n\n")
+            yield "".join(buf)
             
         except Exception as e:
             yield f"❌ Analysis failed with error: {str(e)}\n\n"
     
-    def get_sample_repos(self) -> List[Dict[str, str]]:
+    def get_sample_repos(self) -> Tuple[Mapping[str, str], ...]:
         """
         Get list of sample Azure DevOps repositories for testing.
         
         Returns:
-            List of sample repository information
+            Read-only tuple of sample repository information
         """
-        return [
-            {
-                "name": "Biller Search API",
-                "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerSearchAPI",
-                "description": "Quick Find"
-            },
-            {
-                "name": "MyIIS",
-                "url": "https://dev.azure.com/invoicecloud/Src/_git/MyIIS",
-                "description": "Shared repo"
-            },
-            {
-                "name": "Biller Reporting Chat API",
-                "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerReportingChatAPI",
-                "description": "AI reporting"
-            },
-            {
-                "name": "Biller Reporting API",
-                "url": "https://dev.azure.com/invoicecloud/Biller/_git/BillerReportingAPI",
-                "description": "GraphQL schema and resolvers"
-            }
-        ]
+        return _SAMPLE_REPOS
     
-    def get_sample_errors(self) -> List[str]:
+    def get_sample_errors(self) -> Tuple[str, ...]:
         """
         Get list of sample error messages for testing.
         Focused on .NET and common enterprise application errors.
         
         Returns:
-            List of sample error messages
+            Read-only tuple of sample error messages
         """
-        return [
-            # .NET specific errors with stack traces
-            """System.NullReferenceException: Object reference not set to an instance of an object.""",
-            
-            """System.ArgumentNullException: Value cannot be null.""",
-            
-            """System.Data.SqlClient.SqlException: A network-related or instance-specific error occurred while establishing a connection to SQL Server.""",
-
-            # Configuration and deployment errors
-            "System.IO.FileNotFoundException: Could not load file or assembly 'Newtonsoft.Json, Version=13.0.0.0' or one of its dependencies.",
-            
-            "System.Security.SecurityException: Request for the permission of type 'System.Security.Permissions.FileIOPermission' failed.",
-            
-            # Web-specific errors
-            "System.Web.UI.ViewStateException: Invalid viewstate. Client IP: 192.168.1.100 User-Agent: Mozilla/5.0",
-            
-            "System.Web.Services.Protocols.SoapException: Server was unable to process request. ---> System.ArgumentException: Invalid billing account number.",
-            
-            # Modern .NET Core errors
-            "Microsoft.AspNetCore.Http.BadHttpRequestException: Reading the request body timed out due to data arriving too slowly.",
-            
-            "System.Text.Json.JsonException: The JSON value could not be converted to System.DateTime."
-        ]
+        return _SAMPLE_ERRORS
 
 
-# Create a global instance for use in UI
-error_analysis_feature = ErrorAnalysisFeature()
\ No newline at end of file
+# Shared instance for the UI, created lazily on first use
+@lru_cache(maxsize=1)
+def get_error_analysis_feature() -> ErrorAnalysisFeature:
+    """Return the shared error analysis feature, creating it on first call."""
+    return ErrorAnalysisFeature()
\ No newline at end of file
@@ -1,40 +1,63 @@
-import json
+import orjson
 import sys
 import os
+import re
+import threading
+from collections import OrderedDict
 # Add parent directory to path to import from root
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from system_prompt import system_prompt 
 from config import OPENAI_KEY, IC_OpenAI_URL
 import requests
+from requests.adapters import HTTPAdapter
+
+COMPLETION_CACHE_SIZE = 1024  # (normalized prompt, model) pairs remembered by message_gpt
+
+# One keep-alive session for every ticket request so repeat clicks skip the TLS handshake
+_session = requests.Session()
+_session.headers.update({'api-key': OPENAI_KEY, 'Content-Type': 'application/json'})
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))  # matches the UI queue concurrency
+
+# system message encoded once; each call only encodes the user prompt between these
+_PAYLOAD_PREFIX = b'{"messages":[' + orjson.dumps({"role": "system", "content": system_prompt}) + b',{"role":"user","content":'
+_PAYLOAD_SUFFIX = b'}]}'
+
+_completion_cache = OrderedDict()  # (normalized prompt, model) -> answer, least recently used first
+_completion_cache_lock = threading.Lock()
+
+def _complete(user_prompt):
+    """Fetch one completion; failures raise, so only successful answers are cached."""
+    payload = _PAYLOAD_PREFIX + orjson.dumps(user_prompt) + _PAYLOAD_SUFFIX
+    response = _session.post(IC_OpenAI_URL, data=payload)
+    response_data = orjson.loads(response.content)
+    return response_data['choices'][0]['message']['content']
+
+_SPACES_RE = re.compile(r"[ \t]+")
+_BLANK_LINES_RE = re.compile(r"\s*\n\s*\n\s*")
+
+def _normalize_prompt(user_prompt):
+    """Collapse whitespace-only differences so pasted templates hit the same cache entry."""
+    text = _SPACES_RE.sub(" ", user_prompt.strip())
+    return _BLANK_LINES_RE.sub("\n\n", text)
 
 def message_gpt(user_prompt, model_type):
     if not user_prompt or not model_type:
         return "❌ All fields are required."
 
     try:
-        headers = {
-            'api-key': OPENAI_KEY,
-            'Content-Type': 'application/json'
-        }
-        payload =json.dumps({
-            "messages": [
-                {
-                "role": "system",
-                "content": system_prompt
-                },
-                {
-                "role": "user",
-                "content": user_prompt
-                }
-            ]
-        })
-        response = requests.request(
-        "POST", IC_OpenAI_URL, 
-        headers= headers,
-        data= payload
-        )
-        response_data = response.json()
-        return response_data['choices'][0]['message']['content']
+        # repeated clicks with the same description reuse the earlier answer; only the cache
+        # key is normalized, the model always gets the prompt exactly as the user wrote it
+        key = (_normalize_prompt(user_prompt), model_type)
+        with _completion_cache_lock:
+            if key in _completion_cache:
+                _completion_cache.move_to_end(key)
+                return _completion_cache[key]
+        answer = _complete(user_prompt)
+        with _completion_cache_lock:
+            _completion_cache[key] = answer
+            if len(_completion_cache) > COMPLETION_CACHE_SIZE:
+                _completion_cache.popitem(last=False)
+        return answer
     except Exception as e:
         return f"❌ Error: {str(e)}"
     
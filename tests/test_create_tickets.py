@@ -0,0 +1,77 @@
+import orjson
+
+from agents.create_tickets import BULK_CHUNK_SIZE, MISSING_SECTIONS_MESSAGE, JIRACreator
+
+DESCRIPTION = "User Story: as a user\nAcceptance Criteria: it works\nScenarios: try it"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = orjson.dumps(body)
+        self.text = self.content.decode()
+
+
+class FakeSession:
+    """Answers each bulk POST with the next canned response and records the payloads."""
+
+    def __init__(self, responses):
+        self.responses = iter(responses)
+        self.payloads = []
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.payloads.append(orjson.loads(data))
+        return next(self.responses)
+
+
+def _ticket(n, **overrides):
+    ticket = {"summary": f"Ticket {n}", "description": DESCRIPTION, "issue_type": "Story", "project_key": "ED"}
+    ticket.update(overrides)
+    return ticket
+
+
+def _issues(keys):
+    return [{"key": key} for key in keys]
+
+
+def test_create_tickets_bulk_maps_failures_in_second_chunk():
+    # one invalid ticket up front is skipped before sending, so chunk positions differ from input indexes
+    tickets = [_ticket(0, summary="")] + [_ticket(n) for n in range(1, BULK_CHUNK_SIZE + 6)]
+    first_chunk = FakeResponse(201, {"issues": _issues(f"ED-{n}" for n in range(BULK_CHUNK_SIZE)), "errors": []})
+    second_chunk = FakeResponse(201, {
+        "issues": _issues(["ED-100", "ED-101", "ED-102"]),
+        "errors": [
+            {"failedElementNumber": 1, "status": 400, "elementErrors": {"errors": {"summary": "too long"}}},
+            {"failedElementNumber": 3, "status": 400, "elementErrors": {"errors": {"issuetype": "invalid"}}},
+        ],
+    })
+    creator = JIRACreator()
+    creator.session = FakeSession([first_chunk, second_chunk])
+
+    results = creator.create_tickets_bulk(tickets)
+
+    assert [len(p["issueUpdates"]) for p in creator.session.payloads] == [BULK_CHUNK_SIZE, 5]
+    assert results[0] == "❌ All fields are required."
+    assert results[1:BULK_CHUNK_SIZE + 1] == [f"✅ Ticket created: ED-{n}" for n in range(BULK_CHUNK_SIZE)]
+    # positions 1 and 3 of the second chunk failed; the created issues fill the others in order
+    second = results[BULK_CHUNK_SIZE + 1:]
+    assert second[0] == "✅ Ticket created: ED-100"
+    assert second[1].startswith("❌ Failed: 400") and "too long" in second[1]
+    assert second[2] == "✅ Ticket created: ED-101"
+    assert second[3].startswith("❌ Failed: 400") and "invalid" in second[3]
+    assert second[4] == "✅ Ticket created: ED-102"
+
+
+def test_create_tickets_bulk_rejected_chunk_fails_only_its_tickets():
+    tickets = [_ticket(n) for n in range(BULK_CHUNK_SIZE + 2)] + [_ticket(99, description="no sections")]
+    creator = JIRACreator()
+    creator.session = FakeSession([
+        FakeResponse(201, {"issues": _issues(f"ED-{n}" for n in range(BULK_CHUNK_SIZE)), "errors": []}),
+        FakeResponse(503, {"message": "unavailable"}),
+    ])
+
+    results = creator.create_tickets_bulk(tickets)
+
+    assert results[BULK_CHUNK_SIZE - 1] == f"✅ Ticket created: ED-{BULK_CHUNK_SIZE - 1}"
+    assert all(r.startswith("❌ Failed: 503") for r in results[BULK_CHUNK_SIZE:BULK_CHUNK_SIZE + 2])
+    assert results[-1] == MISSING_SECTIONS_MESSAGE
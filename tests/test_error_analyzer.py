@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from agents.error_analyzer import (
+    SAMPLE_ERROR_MESSAGE,
+    ErrorAnalyzer,
+    _DiskCache,
+    _allocate_budgets,
+    _mentioned_files,
+)
+
+
+@pytest.fixture
+def analyzer():
+    return ErrorAnalyzer()
+
+
+def test_mentioned_files_from_sample_trace():
+    # each pattern contributes its own matches, including the overlapping page and code-behind names
+    assert _mentioned_files(SAMPLE_ERROR_MESSAGE) == {
+        'RemoveLogin.aspx.vb',
+        'RemoveLogin.aspx',
+        'Dialogs_RemoveLogin.Config',
+    }
+
+
+def test_mentioned_files_unix_and_bare_names():
+    message = "FileNotFoundException: /app/config/appsettings.json; see Startup.cs"
+    assert _mentioned_files(message) >= {'appsettings.json', 'Startup.cs'}
+
+
+def test_allocate_budgets_gives_surplus_to_large_files():
+    # the two small files keep their full size and the large one gets what is left
+    assert _allocate_budgets([100, 5000, 50], 3000, 10000) == [100, 2850, 50]
+
+
+def test_allocate_budgets_respects_cap_and_total():
+    assert _allocate_budgets([5000, 5000], 20000, 3000) == [3000, 3000]
+    budgets = _allocate_budgets([400, 900, 2500, 60], 1000, 10000)
+    assert sum(budgets) <= 1000
+    assert budgets[3] == 60
+
+
+def test_allocate_budgets_with_nothing_left():
+    assert _allocate_budgets([10, 20], -5, 100) == [0, 0]
+
+
+def test_smart_truncate_keeps_short_content(analyzer):
+    assert analyzer._smart_truncate_content("short file", 100, "Anything") == "short file"
+
+
+def test_smart_truncate_falls_back_to_head_and_tail(analyzer):
+    # no error keywords to score lines by, so the head and tail are kept
+    content = "".join(chr(ord('a') + i % 26) for i in range(1000))
+    result = analyzer._smart_truncate_content(content, 100, "")
+    assert result == content[:70] + '\n...[truncated]...\n' + content[-11:]
+    assert len(result) == 100
+
+
+def test_smart_truncate_falls_back_for_minified_content(analyzer):
+    content = "x" * 5000  # one long line: no line structure to score
+    result = analyzer._smart_truncate_content(content, 200, "NullReferenceException")
+    assert result.startswith("x" * 140)
+    assert '...[truncated]...' in result
+
+
+def test_smart_truncate_selects_keyword_lines(analyzer):
+    lines = [f"    value_{i} = value_{i - 1} + 1" for i in range(200)]
+    lines[120] = "    order = LoadOrder(orderId) ' NullReferenceException here"
+    content = "\n".join(lines)
+    result = analyzer._smart_truncate_content(content, 1000, "NullReferenceException in LoadOrder")
+    result_lines = result.split("\n")
+    # the beginning is always kept, then the matching line with its line number
+    assert result_lines[:20] == lines[:20]
+    assert "... (line 121) ..." in result_lines
+    assert lines[120] in result_lines
+    # lines that match nothing are not pulled in
+    assert lines[150] not in result_lines
+    assert len(result) <= 1000
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = _DiskCache(str(tmp_path))
+    cache.set('key', {'a': [1, 2]})
+    assert cache.get('key') == {'a': [1, 2]}
+    assert cache.get('missing') is None
+
+
+def test_disk_cache_evicts_oldest_entries(tmp_path):
+    cache = _DiskCache(str(tmp_path), max_bytes=1000)
+    for i in range(40):
+        cache.set(f'key{i}', 'x' * 50)
+        # spread the mtimes out so eviction order doesn't depend on filesystem timestamp resolution
+        os.utime(cache._path(f'key{i}'), (1000 + i, 1000 + i))
+    total = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+    assert total <= 1000
+    assert cache.get('key39') == 'x' * 50
+    assert cache.get('key0') is None
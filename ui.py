@@ -1,12 +1,70 @@
 import gradio as gr
 import sys
 import io
+import threading
 from contextlib import redirect_stdout, redirect_stderr
-from features.ticket_generator import message_gpt
-from features.chatbot import chat_with_knowledge_base, Knowledge
-from features.error_analysis import error_analysis_feature
-from agents.create_tickets import JIRACreator
-from agents.create_files import WebScraper
+import functools
+from features.error_analysis import get_error_analysis_feature
+
+
+class ThreadStdoutRouter:
+    """stdout proxy that also forwards each registered thread's output to that thread's queue."""
+    def __init__(self, original_stdout):
+        self.original_stdout = original_stdout
+        self.queues = {}  # thread id -> queue
+    
+    def register(self, queue_ref):
+        self.queues[threading.get_ident()] = queue_ref
+    
+    def unregister(self):
+        self.queues.pop(threading.get_ident(), None)
+    
+    def write(self, text):
+        queue_ref = self.queues.get(threading.get_ident())
+        if queue_ref is not None and text and text.strip():
+            queue_ref.put(text)
+        return self.original_stdout.write(text)
+    
+    def flush(self):
+        self.original_stdout.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self.original_stdout, name)
+
+
+# The chat, ticket and crawler modules pull in LangChain, Chroma and the Jira/Confluence
+# clients, so they are imported on first use rather than when the UI is built
+def message_gpt(user_prompt, model_type):
+    from features.ticket_generator import message_gpt
+    return message_gpt(user_prompt, model_type)
+
+
+@functools.lru_cache(maxsize=1)
+def get_jira_creator():
+    from agents.create_tickets import JIRACreator
+    return JIRACreator()
+
+
+def create_ticket(summary, description, issue_type, email, API_token, project_key):
+    return get_jira_creator().create_ticket(summary, description, issue_type, email, API_token, project_key)
+
+
+@functools.lru_cache(maxsize=1)
+def get_webscraper():
+    """One crawler for the process, so its pooled Confluence session is reused across updates."""
+    from agents.create_files import WebScraper
+    return WebScraper()
+
+
+def chat_with_knowledge_base(question, history, request: gr.Request):
+    from features.chatbot import chat_with_knowledge_base
+    return chat_with_knowledge_base(question, history, request)
+
+
+# Installed once for the process so concurrent knowledge updates never swap sys.stdout under
+# each other; output is routed by thread, so each session only sees its own worker's logs
+stdout_router = ThreadStdoutRouter(sys.stdout)
+sys.stdout = stdout_router
 
 with gr.Blocks(css="""
                .custom-btn-1 {background-color: #1976d2; color: white; border-radius: 8px;}
@@ -85,8 +143,9 @@ with gr.Blocks(css="""
 
         show_creds.change(toggle_creds, inputs=[show_creds], outputs=[email_box, token_box, instruction])
 
+
         submit_btn.click(fn=message_gpt, inputs=[description, model_type], outputs=output_content)
-        create_btn.click(fn=JIRACreator.create_ticket, inputs=[summary, output_content, issue_type, email_box, token_box, project_key], outputs=output)
+        create_btn.click(fn=create_ticket, inputs=[summary, output_content, issue_type, email_box, token_box, project_key], outputs=output)
         
     
     with gr.Column(visible=False) as error_page:
@@ -104,7 +163,7 @@ with gr.Blocks(css="""
             
             with gr.Column(scale=1):
                 gr.Markdown("### 💡 Sample Error Messages")
-                sample_errors = error_analysis_feature.get_sample_errors()
+                sample_errors = get_error_analysis_feature().get_sample_errors()
                 sample_error_dropdown = gr.Dropdown(
                     choices=sample_errors,
                     label="Quick Examples",
@@ -122,7 +181,7 @@ with gr.Blocks(css="""
             
             with gr.Column(scale=1):
                 gr.Markdown("### 📚 Sample Repositories")
-                sample_repos = error_analysis_feature.get_sample_repos()
+                sample_repos = get_error_analysis_feature().get_sample_repos()
                 sample_repo_dropdown = gr.Dropdown(
                     choices=[(f"{repo['name']} - {repo['description']}", repo['url']) for repo in sample_repos],
                     label="Quick Examples",
@@ -175,7 +234,7 @@ with gr.Blocks(css="""
             
             result_text = ""
             try:
-                for update in error_analysis_feature.analyze_error_with_ai(error_msg, repo_link):
+                for update in get_error_analysis_feature().analyze_error_with_ai(error_msg, repo_link):
                     result_text += update
                     # Return both formatted markdown and raw text
                     yield result_text, result_text
@@ -205,8 +264,6 @@ with gr.Blocks(css="""
         ],
         type="messages"
     )
-        webscraper = WebScraper()
-        
         def update_knowledge_base(progress=gr.Progress()):
             """Update the knowledge base from Confluence and force rebuild embeddings."""
             import threading
@@ -233,59 +290,62 @@ with gr.Blocks(css="""
                 return outputs
             
             def fetch_confluence_data_with_timeout(timeout=120):
-                """Fetch Confluence data in a separate thread with timeout."""
+                """Fetch Confluence data in a separate thread with timeout, streaming its progress."""
+                progress_queue = queue.Queue()
+                fetch_result = {"success": False, "completed": False}
+                
                 def fetch_data():
                     try:
-                        webscraper.write_confluence_data_to_file()
-                        return True
+                        # the crawler reports from its own worker threads; a queue is safe to share.
+                        # the deadline is enforced inside the crawl, so it never outlives this handler
+                        fetch_result["completed"] = get_webscraper().write_confluence_data_to_file(
+                            progress_callback=progress_queue.put, timeout=timeout
+                        )
+                        fetch_result["success"] = True
                     except Exception as e:
                         print(f"Confluence fetch error: {e}")
-                        return False
+                    finally:
+                        progress_queue.put(None)  # wake the waiting loop as soon as the crawl ends
                 
                 fetch_thread = threading.Thread(target=fetch_data)
                 fetch_thread.daemon = True
                 fetch_thread.start()
                 
                 start_time = time.time()
-                while fetch_thread.is_alive() and (time.time() - start_time) < timeout:
-                    elapsed = int(time.time() - start_time)
-                    yield f"⏳ Confluence fetch in progress... ({elapsed}s elapsed)\n"
-                    time.sleep(30)
+                while True:
+                    # wake on the next progress line, or every 30s to show the crawl is still alive
+                    try:
+                        line = progress_queue.get(timeout=30)
+                        if line is None:
+                            fetch_thread.join()
+                            break
+                        yield f"   {line}\n"
+                    except queue.Empty:
+                        elapsed = int(time.time() - start_time)
+                        yield f"⏳ Confluence fetch in progress... ({elapsed}s elapsed)\n"
                 
-                if fetch_thread.is_alive():
-                    yield "⚠️ Confluence fetch taking too long, proceeding with existing data...\n"
-                else:
+                if fetch_result["completed"]:
                     yield "✅ Confluence data fetched successfully!\n"
-            
-            class RealtimeCapture:
-                """Custom stdout capture that forwards output to queue in real-time."""
-                def __init__(self, queue_ref, original_stdout):
-                    self.queue = queue_ref
-                    self.original_stdout = original_stdout
-                
-                def write(self, text):
-                    if text and text.strip():
-                        self.queue.put(text)
-                    self.original_stdout.write(text)
-                
-                def flush(self):
-                    self.original_stdout.flush()
+                elif fetch_result["success"]:
+                    yield "⚠️ Confluence fetch incomplete, proceeding with existing data...\n"
+                else:
+                    yield "⚠️ Confluence fetch failed, proceeding with existing data...\n"
             
             def create_embeddings_with_monitoring(knowledge, chunks, output_queue):
                 """Create embeddings with stdout monitoring."""
                 embedding_result = {"success": False, "error": None}
                 
                 def create_embeddings():
-                    old_stdout = sys.stdout
                     try:
-                        # Redirect stdout to capture output
-                        sys.stdout = RealtimeCapture(output_queue, old_stdout)
+                        # Capture this thread's output only
+                        stdout_router.register(output_queue)
                         knowledge.get_embeddings_using_Azure(chunks, update_knowledge_base=True)
                         embedding_result["success"] = True
                     except Exception as e:
                         embedding_result["error"] = str(e)
                     finally:
-                        sys.stdout = old_stdout
+                        stdout_router.unregister()
+                        output_queue.put(None)  # wake the monitor as soon as the run ends
                 
                 # Start embedding thread
                 embedding_thread = threading.Thread(target=create_embeddings)
@@ -294,17 +354,28 @@ with gr.Blocks(css="""
                 
                 return embedding_thread, embedding_result
             
-            def monitor_embedding_progress(embedding_thread, output_queue, update_interval=60):
+            def monitor_embedding_progress(embedding_thread, output_queue, update_interval=60, poll_timeout=5.0):
                 """Monitor embedding progress and yield updates."""
                 start_time = time.time()
                 last_update = 0
                 recent_outputs = []
                 
                 while embedding_thread.is_alive():
+                    # Block until the worker prints something (or the poll times out) instead of
+                    # sleeping a fixed interval, so log lines reach the UI as they are written
+                    try:
+                        first_output = output_queue.get(timeout=poll_timeout)
+                    except queue.Empty:
+                        first_output = ""
+                    if first_output is None:
+                        # end-of-run marker: leave now instead of after another poll
+                        embedding_thread.join()
+                        break
                     elapsed = int(time.time() - start_time)
                     
                     # Collect new outputs
-                    new_outputs = collect_queue_output(output_queue)
+                    new_outputs = [first_output.strip()] if first_output and first_output.strip() else []
+                    new_outputs.extend(collect_queue_output(output_queue))
                     recent_outputs.extend(new_outputs)
                     
                     # Yield immediate updates if we have new output
@@ -324,8 +395,6 @@ with gr.Blocks(css="""
                         
                         # yield status_update
                         last_update = elapsed
-                    
-                    time.sleep(30)  # Check every 30 seconds
             
             def finalize_embedding_results(embedding_result, output_queue):
                 """Process final embedding results and remaining output."""
@@ -378,6 +447,7 @@ with gr.Blocks(css="""
                 log_output += "🔍 Processing documents and creating chunks...\n"
                 yield log_output
                 
+                from features.chatbot import Knowledge
                 knowledge = Knowledge()
                 chunks = knowledge.process_confluence_data()
                 log_output += f"📊 Found {len(chunks)} document chunks to process\n"
@@ -439,44 +509,33 @@ with gr.Blocks(css="""
             )
             
             # Button click handler
+            # one rebuild at a time: concurrent runs would write the same vectorstore
             fetch_update_btn.click(
                 fn=update_knowledge_base,
-                outputs=[update_logs]
+                outputs=[update_logs],
+                concurrency_limit=1
             )
         
       
 
-    def show_jira():
-        return {
-                jira_page: gr.update(visible=True), 
-                chat_page: gr.update(visible=False),
-                error_page: gr.update(visible=False),
-                jira_btn: gr.update(elem_classes=["btn-active"]),
-                chat_btn: gr.update(elem_classes=["btn-inactive"]),
-                error_btn: gr.update(elem_classes=["btn-inactive"])
-                }
-
-    def show_chat():
-        return {
-            jira_page: gr.update(visible=False), 
-            chat_page: gr.update(visible=True),
-            error_page: gr.update(visible=False),
-            jira_btn: gr.update(elem_classes=["btn-inactive"]),
-            chat_btn: gr.update(elem_classes=["btn-active"]),
-            error_btn: gr.update(elem_classes=["btn-inactive"])
-            }
+    nav_pages = {"jira": (jira_page, jira_btn), "chat": (chat_page, chat_btn), "error": (error_page, error_btn)}
+    nav_outputs = [jira_page, chat_page, error_page, jira_btn, chat_btn, error_btn]
 
-    def show_error():
-        return {
-            jira_page: gr.update(visible=False), 
-            chat_page: gr.update(visible=False),
-            error_page: gr.update(visible=True),
-            jira_btn: gr.update(elem_classes=["btn-inactive"]),
-            chat_btn: gr.update(elem_classes=["btn-inactive"]),
-            error_btn: gr.update(elem_classes=["btn-active"])
-            }
+    def show_page(active):
+        """Show one page and highlight its button, hiding the others."""
+        updates = {}
+        for name, (page, btn) in nav_pages.items():
+            updates[page] = gr.update(visible=name == active)
+            updates[btn] = gr.update(elem_classes=["btn-active" if name == active else "btn-inactive"])
+        return updates
 
     
-    jira_btn.click(show_jira, outputs=[jira_page, chat_page, error_page, jira_btn, chat_btn, error_btn])
-    chat_btn.click(show_chat, outputs=[jira_page, chat_page, error_page, jira_btn, chat_btn, error_btn])
-    error_btn.click(show_error, outputs=[jira_page, chat_page, error_page, jira_btn, chat_btn, error_btn])
\ No newline at end of file
+    # the page states are constants, so build each once and return the same updates on every click
+    nav_states = {name: show_page(name) for name in nav_pages}
+    
+    jira_btn.click(lambda: nav_states["jira"], outputs=nav_outputs)
+    chat_btn.click(lambda: nav_states["chat"], outputs=nav_outputs)
+    error_btn.click(lambda: nav_states["error"], outputs=nav_outputs)
+
+# let several users chat / analyze at once instead of serializing every event
+main_ui.queue(default_concurrency_limit=4, max_size=32)